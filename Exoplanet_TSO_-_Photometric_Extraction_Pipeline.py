@@ -156,10 +156,12 @@ planetname_wanderer_median.channel = channel
 print(f'Load Data From Fits Files in {loadfitsdir}')
 planetname_wanderer_median.spitzer_load_fits_file(output_units=output_units)
 
-print('**Double check for NaNs**')
-is_nan_ = np.isnan(planetname_wanderer_median.imageCube)
-med_image_cube = np.nanmedian(planetname_wanderer_median.imageCube)
-planetname_wanderer_median.imageCube[is_nan_] = med_image_cube
+if not planetname_wanderer_median.nan_free:
+    # NaNs are set to the median of their frame while loading the fits files
+    print('**Double check for NaNs**')
+    is_nan_ = np.isnan(planetname_wanderer_median.imageCube)
+    med_image_cube = np.nanmedian(planetname_wanderer_median.imageCube)
+    planetname_wanderer_median.imageCube[is_nan_] = med_image_cube
 
 print('**Identifier Strong Outliers**')
 print('Find, flag, and NaN the "Bad Pixels" Outliers')
@@ -0,0 +1,112 @@
+""" Compare the analytic and finite-difference Jacobian Gaussian fits
+
+Fits the same set of synthetic, noisy Spitzer-like PSFs with `fitgaussian`
+and `lmfit_one_center`, once with the analytic Jacobian and once with
+finite differences, and reports the wall time and largest center offset.
+
+    python benchmarks/benchmark_gaussian_jacobian.py --n_frames 1000
+"""
+import numpy as np
+
+from argparse import ArgumentParser
+from lmfit import Model, Parameters
+from time import time
+
+from wanderer.utils import fitgaussian, gaussian, lmfit_one_center
+
+
+def synthetic_frames(n_frames, frame_size=32, seed=42):
+    rng = np.random.default_rng(seed)
+    yy, xx = np.indices((frame_size, frame_size))
+
+    center = frame_size / 2
+    frames = np.array([
+        gaussian(
+            height=rng.uniform(4000, 6000),
+            center_y=center + rng.normal(0, 0.2),
+            center_x=center + rng.normal(0, 0.2),
+            width_y=rng.uniform(0.9, 1.2),
+            width_x=rng.uniform(0.9, 1.2),
+            offset=rng.uniform(5, 15),
+            yy=yy,
+            xx=xx
+        )
+        for _ in range(n_frames)
+    ])
+
+    return frames + rng.normal(0, 10, frames.shape)
+
+
+def run_fitgaussian(frames, sub_size, use_jacobian):
+    center = frames.shape[1] // 2
+    sub_frames = frames[
+        :,
+        center - sub_size:center + sub_size,
+        center - sub_size:center + sub_size
+    ]
+
+    start = time()
+    centers = [
+        fitgaussian(sub_frame, use_jacobian=use_jacobian)[1:3]
+        for sub_frame in sub_frames
+    ]
+
+    return time() - start, np.array(centers)
+
+
+def run_lmfit(frames, sub_size, use_jacobian):
+    frame_size = frames.shape[1]
+    center = frame_size // 2
+    ylower = xlower = center - sub_size
+    yupper = xupper = center + sub_size
+    yy, xx = np.indices((frame_size, frame_size))
+    yy = yy[ylower:yupper, xlower:xupper]
+    xx = xx[ylower:yupper, xlower:xupper]
+
+    gfit_model = Model(gaussian, independent_vars=['yy', 'xx'])
+    init_params = Parameters()
+    init_params.add_many(
+        ('height', 5000.0, True, 0.0, np.inf),
+        ('center_y', center, True, 0.0, frame_size),
+        ('center_x', center, True, 0.0, frame_size),
+        ('width_y', 1.0, True, 0.0, frame_size),
+        ('width_x', 1.0, True, 0.0, frame_size),
+        ('offset', 10.0, True)
+    )
+
+    start = time()
+    centers = [
+        lmfit_one_center(
+            frame.copy(), yy, xx, gfit_model, init_params,
+            yupper, ylower, xupper, xlower, use_jacobian=use_jacobian
+        )[:2]
+        for frame in frames
+    ]
+
+    return time() - start, np.array(centers)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--n_frames', type=int, default=1000)
+    parser.add_argument('--sub_size', type=int, default=5)
+    clargs = parser.parse_args()
+
+    frames = synthetic_frames(clargs.n_frames)
+
+    for name, fitter in [
+            ('fitgaussian', run_fitgaussian),
+            ('lmfit_one_center', run_lmfit)]:
+        time_fd, centers_fd = fitter(frames, clargs.sub_size, False)
+        time_jac, centers_jac = fitter(frames, clargs.sub_size, True)
+
+        print(
+            f'{name}: finite differences {time_fd:.2f}s, '
+            f'analytic Jacobian {time_jac:.2f}s, '
+            f'speedup {time_fd / time_jac:.2f}x, '
+            f'max center difference {np.abs(centers_fd - centers_jac).max():.2e}'
+        )
+
+
+if __name__ == '__main__':
+    main()
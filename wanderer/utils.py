@@ -1,4 +1,6 @@
-import matplotlib.pyplot as plt
+import gzip
+import hashlib
+import joblib
 import numpy as np
 
 from plotly import graph_objs as go
@@ -8,10 +10,13 @@ from time import time
 
 import os
 import scipy as sp
+import tempfile
 
 from argparse import ArgumentParser
 from astropy.io import fits
 from astropy.modeling import models, fitting
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from functools import partial
 from glob import glob
@@ -56,6 +61,7 @@ class WandererCLI:
     data_dir: str = None
     num_cores: int = 1
     verbose: bool = False
+    use_header_index: bool = False
 
 
 def command_line_inputs(check_defaults=True):
@@ -101,6 +107,10 @@ def command_line_inputs(check_defaults=True):
     ap.add_argument('-nc', '--num_cores', type=int, default=cpu_count()-1)
     ap.add_argument('-v', '--verbose', type=bool,
                     default=False, help='Print out normally irrelevent things.')
+    ap.add_argument('-hi', '--use_header_index', type=bool, default=False,
+                    help='Cache file lists and headers in a sidecar index '
+                    'inside the AOR directory.'
+                    )
 
     args = vars(ap.parse_args())
 
@@ -124,6 +134,7 @@ def convert_args_to_dataclass(args, check_defaults=True):
     data_config.data_dir = args['data_dir']
     data_config.num_cores = args['num_cores']
     data_config.verbose = args['verbose']
+    data_config.use_header_index = args['use_header_index']
 
     if check_defaults:
         # Check important defaults directly
@@ -537,7 +548,265 @@ def plotly_surface3D_plot_centers_vs_flux(
     fig.show()
 
 
-def grab_dir_and_filenames(data_config, fits_format='bcd', unc_format='bunc'):
+HEADER_INDEX_KEYS = (
+    'AORLABEL',
+    'BMJD_OBS',
+    'DATE-OBS',
+    'ET_OBS',
+    'EXPTIME',
+    'FLUXCONV',
+    'FRAMTIME',
+    'GAIN',
+    'PXSCAL1',
+    'PXSCAL2',
+    'TIME-END',
+    'TIME-OBS',
+    'UTCS_OBS',
+)
+
+
+# Uncompressed, gzip, and fpack variants of the same fits file, in order of
+#   preference when more than one variant exists
+FITS_COMPRESSION_SUFFIXES = ('', '.gz', '.fz')
+
+
+def glob_fits_files(fits_file_dir, filetype):
+    """ Glob the `*{filetype}` files and their `.gz` and `.fz` variants
+
+    Each file is listed once; see FITS_COMPRESSION_SUFFIXES for the
+    preferred variant when several exist.
+
+    Args:
+        fits_file_dir (str): Directory containing the fits files.
+        filetype (str): File name ending, i.e. 'bcd.fits'.
+
+    Returns:
+        list: File names
+    """
+    fits_names = {}
+    for suffix in FITS_COMPRESSION_SUFFIXES:
+        pattern = os.path.join(fits_file_dir, f'*{filetype}{suffix}')
+        for fname in glob(pattern):
+            fits_names.setdefault(fname[:len(fname) - len(suffix)], fname)
+
+    return list(fits_names.values())
+
+
+def strip_fits_compression(fname):
+    """ Split `fname` into its uncompressed name and compression suffix """
+    for suffix in FITS_COMPRESSION_SUFFIXES:
+        if suffix and fname.endswith(suffix):
+            return fname[:-len(suffix)], suffix
+
+    return fname, ''
+
+
+def uncertainty_filename(fname, fits_format='bcd', unc_format='bunc'):
+    """ Name of the uncertainty file that belongs to `fname`
+
+    The uncertainty file may be stored with a different compression than
+    `fname`; the same compression is tried first.
+
+    Args:
+        fname (str): Path to the flux file, i.e. '*_bcd.fits.gz'.
+        fits_format (str, optional): Flux file type. Defaults to 'bcd'.
+        unc_format (str, optional): Uncertainty file type.
+            Defaults to 'bunc'.
+
+    Returns:
+        str: Path to the uncertainty file, i.e. '*_bunc.fits.fz'
+    """
+    base, suffix = strip_fits_compression(fname)
+    unc_base = base.replace(f'{fits_format}.fits', f'{unc_format}.fits')
+
+    suffixes = [suffix] + [
+        suffix_ for suffix_ in FITS_COMPRESSION_SUFFIXES if suffix_ != suffix
+    ]
+    for suffix_ in suffixes:
+        if os.path.exists(unc_base + suffix_):
+            return unc_base + suffix_
+
+    return unc_base + suffix
+
+
+def first_data_hdu(hdul):
+    """ First HDU with data, i.e. the CompImageHDU of a `.fits.fz` file """
+    for hdu in hdul:
+        if hdu.header.get('NAXIS', 0) > 0:
+            return hdu
+
+    return hdul[0]
+
+
+def header_index_path(fits_file_dir, filetype):
+    """ Path of the sidecar header index for `filetype` in `fits_file_dir` """
+    return os.path.join(fits_file_dir, f'.wanderer_index_{filetype}.joblib')
+
+
+def load_header_index(fits_file_dir, filetype, header_keys=HEADER_INDEX_KEYS):
+    """ Load file names and header keys from the sidecar header index
+
+    The index stores the path, size, mtime, and `header_keys` of every
+    `*{filetype}` file in `fits_file_dir`. The directory is only re-globbed
+    when its mtime changed, and a header is only re-parsed when the size or
+    mtime of that file changed. The index is rewritten if anything changed.
+
+    Args:
+        fits_file_dir (str): Directory containing the fits files.
+        filetype (str): File name ending to index, i.e. 'bcd.fits'.
+        header_keys (tuple, optional): Header keys to store per file.
+            Defaults to HEADER_INDEX_KEYS.
+
+    Returns:
+        tuple: (list of file names, dict of {basename: {key: value}})
+    """
+    index_path = header_index_path(fits_file_dir, filetype)
+    header_keys = tuple(header_keys)
+
+    index = None
+    if os.path.exists(index_path):
+        try:
+            index = joblib.load(index_path)
+        except Exception as err:
+            print(f'Could not read header index {index_path}: {err}')
+
+    if index is None or index.get('header_keys') != header_keys:
+        index = {'header_keys': header_keys, 'dir_mtime': None, 'files': {}}
+
+    dir_mtime = os.stat(fits_file_dir).st_mtime_ns
+    index_changed = index['dir_mtime'] != dir_mtime
+
+    if index_changed:
+        fits_names = glob_fits_files(fits_file_dir, filetype)
+    else:
+        fits_names = [
+            os.path.join(fits_file_dir, basename)
+            for basename in index['files']
+        ]
+
+    files = {}
+    for fname in fits_names:
+        basename = os.path.basename(fname)
+        fstat = os.stat(fname)
+        entry = index['files'].get(basename)
+
+        if (entry is None
+                or entry['size'] != fstat.st_size
+                or entry['mtime'] != fstat.st_mtime_ns):
+            header = {}
+            if header_keys:
+                with fits.open(fname) as hdul:
+                    header = first_data_hdu(hdul).header
+            entry = {
+                'size': fstat.st_size,
+                'mtime': fstat.st_mtime_ns,
+                'header': {key: header.get(key) for key in header_keys}
+            }
+            index_changed = True
+
+        files[basename] = entry
+
+    if index_changed or len(files) != len(index['files']):
+        index['files'] = files
+        try:
+            joblib.dump(index, index_path, compress=3)
+
+            # Creating the index changes the directory mtime; store the new
+            #   mtime (rewriting in place does not change it again)
+            index['dir_mtime'] = os.stat(fits_file_dir).st_mtime_ns
+            joblib.dump(index, index_path, compress=3)
+        except OSError as err:
+            print(f'Could not write header index {index_path}: {err}')
+
+    headers = {basename: entry['header'] for basename, entry in files.items()}
+
+    return fits_names, headers
+
+
+def cube_cache_key(fits_names, output_units, remove_nans, *extra):
+    """ Hash of the file manifest and the options that change the cubes
+
+    Args:
+        fits_names (list): Ordered list of the fits files in the cubes.
+        output_units (str): Flux units of the cubes.
+        remove_nans (bool): Whether NaNs were replaced in the cubes.
+        *extra: Any other options that change the cubes (i.e. dtype).
+
+    Returns:
+        str: hexadecimal sha1 digest
+    """
+    hasher = hashlib.sha1()
+    for fname in fits_names:
+        fstat = os.stat(fname)
+        hasher.update(
+            f'{os.path.abspath(fname)}|{fstat.st_size}|{fstat.st_mtime_ns}\n'
+            .encode()
+        )
+
+    options = [output_units, remove_nans, *extra]
+    hasher.update('|'.join(str(option) for option in options).encode())
+
+    return hasher.hexdigest()
+
+
+def cube_cache_path(cache_dir, cache_key, name):
+    """ Path of the `.npy` file storing cube `name` under `cache_key` """
+    return os.path.join(cache_dir, f'{cache_key}_{name}.npy')
+
+
+def save_cube_cache(cache_dir, cache_key, **cubes):
+    """ Store each cube in `cubes` as an `.npy` file keyed by `cache_key`
+
+    Each file is written to a temporary name first and then renamed, such
+    that an interrupted run never leaves a partial cache behind.
+
+    Args:
+        cache_dir (str): Directory in which to store the cache.
+        cache_key (str): Key from `cube_cache_key`.
+        **cubes: Arrays to store, by name.
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    for name, cube in cubes.items():
+        cache_path = cube_cache_path(cache_dir, cache_key, name)
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as cache_file:
+            np.save(cache_file, np.asarray(cube))
+
+        os.replace(temp_path, cache_path)
+
+
+def load_cube_cache(cache_dir, cache_key, names, mmap_mode='c'):
+    """ Memory-map the cubes stored by `save_cube_cache`
+
+    Args:
+        cache_dir (str): Directory in which the cache is stored.
+        cache_key (str): Key from `cube_cache_key`.
+        names (list): Names of the cubes to load.
+        mmap_mode (str, optional): `np.load` memmap mode; the default 'c'
+            (copy-on-write) lets in-place edits, i.e. NaN filling, happen in
+            memory without touching the cache. Defaults to 'c'.
+
+    Returns:
+        dict or None: cubes by name, or None if any cube is not cached
+    """
+    cache_paths = {
+        name: cube_cache_path(cache_dir, cache_key, name) for name in names
+    }
+
+    if not all(os.path.exists(path) for path in cache_paths.values()):
+        return None
+
+    return {
+        name: np.load(path, mmap_mode=mmap_mode)
+        for name, path in cache_paths.items()
+    }
+
+
+def grab_dir_and_filenames(
+        data_config, fits_format='bcd', unc_format='bunc',
+        use_header_index=False):
     """
     loadfiledir_parts = [
         data_config.planets_dir,
@@ -570,9 +839,6 @@ def grab_dir_and_filenames(data_config, fits_format='bcd', unc_format='bunc'):
 
     print(f'Current Data Dir: {data_dir}')
 
-    fileExt = f'*{fits_format}.fits'
-    uncsExt = f'*{unc_format}.fits'
-
     fits_file_dir = os.path.join(
         data_dir,
         data_config.aor_dir,
@@ -583,8 +849,16 @@ def grab_dir_and_filenames(data_config, fits_format='bcd', unc_format='bunc'):
 
     print(f'Directory to load fits files from: {fits_file_dir}')
 
-    fitsFilenames = glob(fits_file_dir + fileExt)
-    uncsFilenames = glob(fits_file_dir + uncsExt)
+    if use_header_index:
+        fitsFilenames, _ = load_header_index(
+            fits_file_dir, f'{fits_format}.fits'
+        )
+        uncsFilenames, _ = load_header_index(
+            fits_file_dir, f'{unc_format}.fits', header_keys=()
+        )
+    else:
+        fitsFilenames = glob_fits_files(fits_file_dir, f'{fits_format}.fits')
+        uncsFilenames = glob_fits_files(fits_file_dir, f'{unc_format}.fits')
 
     n_fitsfiles = len(fitsFilenames)
     n_uncfiles = len(uncsFilenames)
@@ -614,6 +888,149 @@ def pool_run_func(func, zipper, num_cores=cpu_count()-1):
         return pool.starmap(func, zipper)
 
 
+def prefetch(items, read_func, depth=4, num_threads=2):
+    """ Yield `read_func(item)` in order while reading ahead in threads
+
+    Up to `depth` upcoming items are read by `num_threads` background threads
+    into a bounded queue, which overlaps slow (i.e. network) storage with the
+    processing of the current item by the caller.
+
+    Args:
+        items (iterable): Items to read, i.e. file paths.
+        read_func (function): Reads one item; called in a background thread.
+        depth (int, optional): Maximum number of items read ahead.
+            Defaults to 4.
+        num_threads (int, optional): Number of reader threads. Defaults to 2.
+
+    Yields:
+        tuple: (result of `read_func`, seconds the caller waited for it)
+    """
+    items = iter(items)
+    depth = max(int(depth), 1)
+
+    with ThreadPoolExecutor(max_workers=max(int(num_threads), 1)) as executor:
+        queue = deque(
+            executor.submit(read_func, item)
+            for _, item in zip(range(depth), items)
+        )
+
+        while queue:
+            future = queue.popleft()
+
+            start = time()
+            result = future.result()
+            stall = time() - start
+
+            # Refill the queue before the caller processes `result`
+            for item in items:
+                queue.append(executor.submit(read_func, item))
+                break
+
+            yield result, stall
+
+
+def read_file_bytes(path):
+    """ Read the bytes of a file, i.e. to decode them in another thread
+
+    `.gz` files are decompressed here, such that the decompression also runs
+    in the reading thread.
+    """
+    with open(path, 'rb') as file_:
+        file_bytes = file_.read()
+
+    if path.endswith('.gz'):
+        file_bytes = gzip.decompress(file_bytes)
+
+    return file_bytes
+
+
+def allocate_cube(shape, dtype=np.float64, memmap_dir=None, name='cube'):
+    """ Allocate a zero-filled cube in RAM or as a disk-backed `np.memmap`
+
+    Args:
+        shape (tuple): Shape of the cube, i.e. (n_frames, ny, nx).
+        dtype (np.dtype, optional): Data type of the cube.
+            Defaults to np.float64.
+        memmap_dir (str, optional): Directory in which to store the memmap
+            file. If None, the cube is allocated in RAM. Defaults to None.
+        name (str, optional): Prefix of the memmap file name, which is made
+            unique such that cubes sharing `memmap_dir` never overwrite each
+            other. Defaults to 'cube'.
+
+    Returns:
+        np.ndarray or np.memmap: zero-filled array of `shape` and `dtype`
+    """
+    if memmap_dir is None:
+        return np.zeros(shape, dtype=dtype)
+
+    os.makedirs(memmap_dir, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(
+            dir=memmap_dir, prefix=f'{name}_', suffix='.memmap',
+            delete=False) as memmap_file:
+        memmap_path = os.path.abspath(memmap_file.name)
+
+    # mode='w+' fills the new, empty file with zeros on disk
+    return np.memmap(memmap_path, dtype=dtype, mode='w+', shape=shape)
+
+
+def append_to_cube(cube, block):
+    """ Append `block` to `cube` along the frame axis
+
+    A writable `np.memmap` cube is grown on disk by appending the bytes of
+    `block` to its file, such that the cost scales with the size of `block`.
+    Any other cube is concatenated in memory.
+
+    Args:
+        cube (np.ndarray or np.memmap): (n_frames, ...) cube.
+        block (np.ndarray): (n_new_frames, ...) frames to append.
+
+    Returns:
+        np.ndarray or np.memmap: (n_frames + n_new_frames, ...) cube
+    """
+    if (isinstance(cube, np.memmap)
+            and cube.filename is not None
+            and cube.mode in ('r+', 'w+')
+            and cube.offset == 0):
+        cube.flush()
+        with open(cube.filename, 'ab') as cube_file:
+            cube_file.write(
+                np.ascontiguousarray(block, dtype=cube.dtype).tobytes()
+            )
+
+        new_shape = (cube.shape[0] + block.shape[0],) + cube.shape[1:]
+
+        return np.memmap(
+            cube.filename, dtype=cube.dtype, mode='r+', shape=new_shape
+        )
+
+    return np.concatenate([cube, np.asarray(block, dtype=cube.dtype)])
+
+
+def fill_nans_with_frame_median(frames):
+    """ Replace the NaNs of each frame with the median of that same frame
+
+    Only frames that contain NaNs are scanned for their median, such that the
+    cost is a single pass over `frames`; frames that are entirely NaN are
+    set to zero.
+
+    Args:
+        frames (np.ndarray): (n_frames, ny, nx) block, edited in place.
+
+    Returns:
+        int: Number of NaNs that were replaced
+    """
+    is_nan_ = np.isnan(frames)
+    for kf in np.where(is_nan_.any(axis=(1, 2)))[0]:
+        frame_now = frames[kf]
+        if is_nan_[kf].all():
+            frame_now[:] = 0.0
+        else:
+            frame_now[is_nan_[kf]] = np.nanmedian(frame_now)
+
+    return int(is_nan_.sum())
+
+
 def gaussian(height, center_y, center_x, width_y, width_x, offset, yy, xx):
     """Class methods are similar to regular functions.
 
@@ -691,7 +1108,73 @@ def moments(data, kernel_size=2, n_sig=4):
     return height, y, x, width_y, width_x, offset
 
 
-def fitgaussian(data, weights=False):
+def gaussian_jacobian(
+        height, center_y, center_x, width_y, width_x, offset, yy, xx,
+        expo=None):
+    """ Analytic derivatives of `gaussian` with respect to its parameters
+
+    Args:
+        height, center_y, center_x, width_y, width_x, offset (float):
+            Parameters of `gaussian`.
+        yy (np.ndarray): Row coordinates of the pixels.
+        xx (np.ndarray): Column coordinates of the pixels.
+        expo (np.ndarray, optional): exp(-r^2 / 2) of the same parameters,
+            i.e. from the last model evaluation. Defaults to None.
+
+    Returns:
+        np.ndarray: (6, *yy.shape) derivatives with respect to height,
+            center_y, center_x, width_y, width_x, offset
+    """
+    dy = yy - center_y
+    dx = xx - center_x
+    if expo is None:
+        expo = np.exp(-0.5 * ((dy / width_y)**2 + (dx / width_x)**2))
+
+    h_expo = height * expo
+
+    return np.array([
+        expo,
+        h_expo * dy / width_y**2,
+        h_expo * dx / width_x**2,
+        h_expo * dy**2 / width_y**3,
+        h_expo * dx**2 / width_x**3,
+        np.ones_like(expo)
+    ])
+
+
+def gaussian_with_jacobian(yy, xx):
+    """ `gaussian` and its analytic Jacobian on fixed pixel grids
+
+    The Jacobian reuses the exponential of the last model evaluation when it
+    is called with the same parameters, as `leastsq` does after each
+    accepted step.
+
+    Args:
+        yy (np.ndarray): Row coordinates of the pixels.
+        xx (np.ndarray): Column coordinates of the pixels.
+
+    Returns:
+        tuple: (model, jacobian) functions of the six `gaussian` parameters
+    """
+    last = {'params': None, 'expo': None}
+
+    def model(*params):
+        height, center_y, center_x, width_y, width_x, offset = params
+        expo = np.exp(-0.5 * (
+            ((yy - center_y) / width_y)**2 + ((xx - center_x) / width_x)**2
+        ))
+        last['params'], last['expo'] = params, expo
+
+        return height * expo + offset
+
+    def jacobian(*params):
+        expo = last['expo'] if last['params'] == params else None
+        return gaussian_jacobian(*params, yy, xx, expo=expo)
+
+    return model, jacobian
+
+
+def fitgaussian(data, weights=False, use_jacobian=True, params=None):
     """Class methods are similar to regular functions.
 
     Note:
@@ -715,14 +1198,28 @@ def fitgaussian(data, weights=False):
     elif weights.dtype != np.dtype('float'):
         weights = np.array(weights, dtype=float)
 
-    params = moments(data)
+    if params is None:
+        params = moments(data)
 
     yy, xx = np.indices(data.shape)
 
-    gausspartial = partial(gaussian, yy=yy, xx=xx)
+    if not use_jacobian:
+        gausspartial = partial(gaussian, yy=yy, xx=xx)
+
+        def errorfunction(p): return np.ravel((gausspartial(*p) - data)*weights)
+        params, _ = sp.optimize.leastsq(errorfunction, params)
+
+        return params
+
+    model, jacobian = gaussian_with_jacobian(yy, xx)
+
+    def errorfunction(p): return np.ravel((model(*p) - data)*weights)
 
-    def errorfunction(p): return np.ravel((gausspartial(*p) - data)*weights)
-    params, _ = sp.optimize.leastsq(errorfunction, params)
+    def jacobian_function(p): return (jacobian(*p)*weights).reshape(6, -1)
+
+    params, _ = sp.optimize.leastsq(
+        errorfunction, params, Dfun=jacobian_function, col_deriv=True
+    )
 
     return params
 
@@ -1009,6 +1506,147 @@ def flux_weighted_centroid(image, ypos, xpos, b_size=7):
     return (ypeak, xpeak)
 
 
+def flux_weighted_centroid_cube(image_cube, ypos, xpos, b_size=7,
+                                n_recenter=0):
+    """ Flux-weighted centroids (Knutson et al. 2008) of all frames at once
+
+    Same box and centroid as `flux_weighted_centroid`, computed with a few
+    reductions over the stacked (n_frames, 2*b_size, 2*b_size) boxes.
+
+    Args:
+        image_cube (np.ndarray): Frames (n_frames, ny, nx).
+        ypos (float): Row of the star; truncated to a pixel.
+        xpos (float): Column of the star; truncated to a pixel.
+        b_size (int, optional): Half width of the box. Defaults to 7.
+        n_recenter (int, optional): Number of times each frame's box is
+            moved to its rounded centroid and measured again. Defaults to 0.
+
+    Returns:
+        np.ndarray: (n_frames, 2) y and x centroids in image coordinates
+    """
+    n_frames, ny, nx = image_cube.shape
+    ypos, xpos, b_size = np.int32([ypos, xpos, b_size])
+    box_rng = np.arange(2 * b_size)
+
+    ystart = np.full(n_frames, ypos - b_size)
+    xstart = np.full(n_frames, xpos - b_size)
+    sub_cube = image_cube[
+        :, ystart[0]:ystart[0] + 2*b_size, xstart[0]:xstart[0] + 2*b_size
+    ]
+
+    for k_iter in range(n_recenter + 1):
+        if k_iter > 0:
+            ystart = np.clip(
+                np.round(centroids[:, 0]).astype(int) - b_size, 0, ny - 2*b_size
+            )
+            xstart = np.clip(
+                np.round(centroids[:, 1]).astype(int) - b_size, 0, nx - 2*b_size
+            )
+            sub_cube = image_cube[
+                np.arange(n_frames)[:, None, None],
+                (ystart[:, None] + box_rng)[:, :, None],
+                (xstart[:, None] + box_rng)[:, None, :]
+            ]
+
+        yflux = sub_cube.sum(axis=2)
+        xflux = sub_cube.sum(axis=1)
+        total = yflux.sum(axis=1)
+
+        centroids = np.transpose([
+            yflux @ box_rng / total + ystart,
+            xflux @ box_rng / total + xstart
+        ])
+
+    return centroids
+
+
+def quadratic_peak_centers(
+        sub_frames, window=3, yseeds=None, xseeds=None, n_refine=0):
+    """ Sub-pixel peaks of 2D quadratics fit to every frame at once
+
+    f(y, x) = a + b y + c x + d y^2 + e x y + g x^2 is fit by least squares
+    to the `window` x `window` pixels around each seed, with one
+    pseudo-inverse of the design matrix shared by all frames, and its peak
+    follows in closed form. Frames whose quadratic has no maximum inside
+    the window fall back to the center of light of the window.
+
+    Args:
+        sub_frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        window (int, optional): Odd width of the neighborhood, i.e. 3 or 5.
+            Defaults to 3.
+        yseeds (np.ndarray, optional): (n_frames,) rows around which to fit.
+            Defaults to None, i.e. the brightest pixel of each frame.
+        xseeds (np.ndarray, optional): (n_frames,) columns around which to
+            fit. Defaults to None, i.e. the brightest pixel of each frame.
+        n_refine (int, optional): Number of times each window is moved onto
+            its rounded peak and fit again. Defaults to 0.
+
+    Returns:
+        np.ndarray: (n_frames, 2) y and x peaks in stack coordinates
+    """
+    if window < 3 or window % 2 == 0:
+        raise ValueError('`window` must be an odd integer of at least 3')
+
+    sub_frames = np.asarray(sub_frames)
+    n_frames, ny, nx = sub_frames.shape
+    half = window // 2
+    frames = np.arange(n_frames)
+
+    if yseeds is None or xseeds is None:
+        yseeds, xseeds = np.unravel_index(
+            sub_frames.reshape(n_frames, -1).argmax(axis=1), (ny, nx)
+        )
+
+    ycenters = np.clip(np.rint(yseeds).astype(int), half, ny - half - 1)
+    xcenters = np.clip(np.rint(xseeds).astype(int), half, nx - half - 1)
+
+    window_y, window_x = np.indices((window, window)) - half
+    window_y = window_y.ravel()
+    window_x = window_x.ravel()
+    design = np.transpose([
+        np.ones(window**2), window_y, window_x,
+        window_y**2, window_y * window_x, window_x**2
+    ])
+    design_pinv = np.linalg.pinv(design)
+
+    for k_iter in range(n_refine + 1):
+        windows = sub_frames[
+            frames[:, None, None],
+            (ycenters[:, None] + np.arange(-half, half + 1))[:, :, None],
+            (xcenters[:, None] + np.arange(-half, half + 1))[:, None, :]
+        ].reshape(n_frames, -1).astype(float)
+
+        _, b, c, d, e, g = (windows @ design_pinv.T).T
+
+        # Zero gradient: [[2d, e], [e, 2g]] @ [y, x] = -[b, c]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            det = 4 * d * g - e**2
+            yoffsets = (e * c - 2 * g * b) / det
+            xoffsets = (e * b - 2 * d * c) / det
+
+        is_peak = (det > 0) & (d < 0)
+        is_peak &= (np.abs(yoffsets) <= half) & (np.abs(xoffsets) <= half)
+
+        if not is_peak.all():
+            # Center of light of the window, above its lowest pixel
+            weights = windows[~is_peak]
+            weights = weights - weights.min(axis=1)[:, None]
+            total = np.where(weights.sum(axis=1) > 0, weights.sum(axis=1), 1)
+            yoffsets[~is_peak] = weights @ window_y / total
+            xoffsets[~is_peak] = weights @ window_x / total
+
+        if k_iter == n_refine:
+            break
+
+        # Move the windows whose peak is nearer to another pixel
+        ycenters = np.clip(
+            ycenters + np.rint(yoffsets).astype(int), half, ny - half - 1)
+        xcenters = np.clip(
+            xcenters + np.rint(xoffsets).astype(int), half, nx - half - 1)
+
+    return np.transpose([ycenters + yoffsets, xcenters + xoffsets])
+
+
 def gaussian(height, center_y, center_x, width_y, width_x, offset, yy, xx):
     """Class methods are similar to regular functions.
 
@@ -1086,6 +1724,90 @@ def moments(data, n_sig=4):
     return height, y, x, width_y, width_x, offset
 
 
+def moments_cube(sub_frames, n_sig=4):
+    """ `moments` of every frame of a stack at once
+
+    The per-frame medians and quartiles are read off one sort of each frame
+    and the rest are reductions along the pixel axis, so the result matches
+    `moments`, including its order with the row centroid third.
+
+    Args:
+        sub_frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        n_sig (float, optional): Threshold above the offset, in standard
+            deviations of the inter-quartile pixels, of the pixels used for
+            the widths. Defaults to 4.
+
+    Returns:
+        np.ndarray: (n_frames, 6) height, column centroid, row centroid,
+            width_y, width_x, offset; as `moments`
+    """
+    n_frames = sub_frames.shape[0]
+    flat = np.asarray(sub_frames, dtype=float).reshape(n_frames, -1)
+    n_pix = flat.shape[1]
+
+    yinds, xinds = np.indices(sub_frames.shape[1:])
+    yinds = yinds.ravel()
+    xinds = xinds.ravel()
+
+    total = flat.sum(axis=1)
+    ycenter = flat @ yinds / total
+    xcenter = flat @ xinds / total
+    height = flat.max(axis=1)
+
+    flat_sorted = np.sort(flat, axis=1)
+    frames = np.arange(n_frames)
+
+    def median_of_sorted(start, count):
+        # Median of flat_sorted[k, start:start + count] for each frame k
+        lower = np.clip(start + (count - 1) // 2, 0, n_pix - 1)
+        upper = np.clip(start + count // 2, 0, n_pix - 1)
+        median = 0.5 * (
+            flat_sorted[frames, lower] + flat_sorted[frames, upper]
+        )
+        return np.where(count > 0, median, np.nan)
+
+    med_data = median_of_sorted(0, n_pix)
+    n_below = (flat < med_data[:, None]).sum(axis=1)
+    n_above = (flat > med_data[:, None]).sum(axis=1)
+    firstq = median_of_sorted(0, n_below)
+    thirdq = median_of_sorted(n_pix - n_above, n_above)
+
+    in_range_ = (flat > firstq[:, None]) & (flat < thirdq[:, None])
+    n_in_range = in_range_.sum(axis=1)
+    start_in_range = (flat <= firstq[:, None]).sum(axis=1)
+    offset = median_of_sorted(start_in_range, n_in_range)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        flat_in_range = np.where(in_range_, flat, np.nan)
+        std_in_range = np.sqrt(
+            np.nansum(
+                (flat_in_range - np.nanmean(flat_in_range, axis=1)[:, None])**2,
+                axis=1
+            ) / n_in_range
+        )
+
+        places = flat > (n_sig * std_in_range + offset)[:, None]
+        n_places = places.sum(axis=1)
+
+        def places_std(inds):
+            mean = places @ inds / n_places
+            return np.sqrt(
+                (places * (inds - mean[:, None])**2).sum(axis=1) / n_places
+            )
+
+        width_y = places_std(yinds)
+        width_x = places_std(xinds)
+
+    # Only one significant point above the background is taken to mean a
+    #   width smaller than one pixel, as in `moments`
+    width_y[width_y == 0.0] = 0.5
+    width_x[width_x == 0.0] = 0.5
+
+    height = height - offset
+
+    return np.transpose([height, xcenter, ycenter, width_y, width_x, offset])
+
+
 def lame_lmfit_gaussian_centering(
         image_cube, yguess=15, xguess=15, sub_array_size=10,
         init_params=None, n_sig=None, use_moments=False, method='leastsq'):
@@ -1172,9 +1894,486 @@ def lame_lmfit_gaussian_centering(
     return heights, ycenters, xcenters, ywidths, xwidths, offsets
 
 
+# Retry cascade of `least_asymmetry_centers` settings:
+#   (square the image preserving signs, asym_rad, asym_size)
+#   1. Default settings, developed for Spitzer exoplanet lightcurves
+#   2. A deformed PSF: square the image
+#   3. A cosmic ray hit near the PSF: halve asym_rad
+#   4. Both: square the image and halve asym_rad
+#   5. Both, and shrink asym_size to 3 (reduces accuracy dramatically)
+LEAST_ASYMMETRY_OPTIONS = (
+    (False, 8, 5),
+    (True, 8, 5),
+    (False, 4, 5),
+    (True, 4, 5),
+    (True, 4, 3),
+)
+
+
+def least_asymmetry_fitted_options(
+        frame_shape, options=LEAST_ASYMMETRY_OPTIONS):
+    """ Options shrunk to the asymmetry boxes that fit in the frames
+
+    `least_asymmetry_centers` needs frames of at least
+    2*(asym_rad + asym_size) + 1 pixels; near the frame edges the grid of
+    trial centers is narrowed first and then the outermost ring.
+
+    Args:
+        frame_shape (tuple): (ny, nx) shape of the frames.
+        options (tuple, optional): (square, asym_rad, asym_size) settings.
+            Defaults to LEAST_ASYMMETRY_OPTIONS.
+
+    Returns:
+        tuple: The distinct (square, asym_rad, asym_size) settings that fit,
+            in order; empty when the frames are narrower than 5 pixels
+    """
+    max_half_box = (min(frame_shape) - 1) // 2
+
+    fitted = []
+    for square, asym_rad, asym_size in options:
+        asym_size = min(asym_size, max_half_box - 1)
+        asym_rad = min(asym_rad, max_half_box - asym_size)
+        if asym_size < 1 or asym_rad < 1:
+            continue
+
+        if (square, asym_rad, asym_size) not in fitted:
+            fitted.append((square, asym_rad, asym_size))
+
+    return tuple(fitted)
+
+
+def least_asymmetry_rings(asym_rad=8, asym_size=5):
+    """ One-hot ring membership of the box pixels for every trial center
+
+    Args:
+        asym_rad (int, optional): Radius of the outermost ring.
+            Defaults to 8.
+        asym_size (int, optional): Half width of the grid of trial centers.
+            Defaults to 5.
+
+    Returns:
+        np.ndarray: (n_trials * (asym_rad + 1), n_box_pixels) ring
+            memberships; the box is 2*(asym_size + asym_rad) + 1 wide with
+            the trial centers in its middle, in row-major order
+    """
+    half_box = asym_size + asym_rad
+    box_y, box_x = np.indices((2*half_box + 1,)*2)
+    trial_y, trial_x = np.indices((2*asym_size + 1,)*2) + asym_rad
+
+    distance = np.hypot(
+        box_y.ravel() - trial_y.reshape(-1, 1),
+        box_x.ravel() - trial_x.reshape(-1, 1)
+    )
+    rings = np.rint(distance)
+    rings[distance > asym_rad] = -1
+
+    one_hot = rings[:, None, :] == np.arange(asym_rad + 1)[None, :, None]
+
+    return one_hot.reshape(-1, box_y.size).astype(float)
+
+
+def least_asymmetry_surface(
+        frames, ycenters, xcenters, asym_rad=8, asym_size=5):
+    """ Asymmetry of every frame around a grid of trial centers
+
+    The asymmetry of a trial center is the sum, over the rings of integer
+    radius around it out to `asym_rad`, of the number of pixels in the ring
+    times their variance (Lust et al. 2014). With the ring memberships of
+    all trial centers as one-hot rows of a matrix, the surfaces of all
+    frames come from two matrix products.
+
+    Args:
+        frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        ycenters (np.ndarray): (n_frames,) middle row of the trial grids.
+        xcenters (np.ndarray): (n_frames,) middle column of the trial grids.
+        asym_rad (int, optional): Radius of the outermost ring.
+            Defaults to 8.
+        asym_size (int, optional): Half width of the grid of trial centers.
+            Defaults to 5.
+
+    Returns:
+        np.ndarray: (n_frames, 2*asym_size + 1, 2*asym_size + 1) asymmetry
+    """
+    n_frames = len(frames)
+    half_box = asym_size + asym_rad
+    box_rng = np.arange(-half_box, half_box + 1)
+
+    boxes = frames[
+        np.arange(n_frames)[:, None, None],
+        (np.asarray(ycenters)[:, None] + box_rng)[:, :, None],
+        (np.asarray(xcenters)[:, None] + box_rng)[:, None, :]
+    ].reshape(n_frames, -1).astype(float)
+
+    # The variance does not depend on a constant; removing one keeps the
+    #   sums of squares well conditioned
+    boxes -= np.median(boxes, axis=1)[:, None]
+
+    rings = least_asymmetry_rings(asym_rad, asym_size)
+    n_ring = rings.sum(axis=1)
+    ring_sum = boxes @ rings.T
+    ring_sum_sq = boxes**2 @ rings.T
+
+    # n * variance = sum(x^2) - sum(x)^2 / n for every ring and trial center
+    asymmetry = ring_sum_sq - ring_sum**2 / np.where(n_ring > 0, n_ring, 1)
+
+    n_side = 2*asym_size + 1
+    return asymmetry.reshape(n_frames, n_side, n_side, asym_rad + 1).sum(-1)
+
+
+def least_asymmetry_centers(
+        frames, yguess, xguess, asym_rad=8, asym_size=5, maxcounts=2,
+        method='gaus', square=False):
+    """ Least-asymmetry centers of every frame at once
+
+    The minimum of each asymmetry surface must lie inside the grid of trial
+    centers; otherwise the grid is moved onto it, at most `maxcounts`
+    times. The sub-pixel center is then a Gaussian fit (`method='gaus'`) or
+    the center of light (`method='col'`) of the inverted surface.
+
+    Args:
+        frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        yguess (float): Initial row of the center in every frame.
+        xguess (float): Initial column of the center in every frame.
+        asym_rad (int, optional): Radius of the outermost ring.
+            Defaults to 8.
+        asym_size (int, optional): Half width of the grid of trial centers.
+            Defaults to 5.
+        maxcounts (int, optional): Number of times a grid may be moved.
+            Defaults to 2.
+        method (str, optional): 'gaus' or 'col'. Defaults to 'gaus'.
+        square (bool, optional): Fit the image squared, preserving signs.
+            Defaults to False.
+
+    Returns:
+        tuple: (n_frames, 2) y and x centers, NaN where the fit failed, and
+            the (n_frames,) boolean mask of successful frames
+    """
+    if method not in ('gaus', 'col'):
+        raise ValueError("`method` must be in ('gaus', 'col')")
+
+    frames = np.asarray(frames)
+    if square:
+        frames = np.sign(frames) * frames**2
+
+    n_frames, ny, nx = frames.shape
+    half_box = asym_size + asym_rad
+    if min(ny, nx) < 2*half_box + 1:
+        raise ValueError(
+            f'Frames of shape {(ny, nx)} cannot hold the asymmetry box of '
+            f'asym_rad={asym_rad} and asym_size={asym_size}'
+        )
+
+    ycenters = np.full(n_frames, int(np.rint(yguess)))
+    xcenters = np.full(n_frames, int(np.rint(xguess)))
+    ycenters = np.clip(ycenters, half_box, ny - half_box - 1)
+    xcenters = np.clip(xcenters, half_box, nx - half_box - 1)
+
+    n_side = 2*asym_size + 1
+    surfaces = np.zeros((n_frames, n_side, n_side))
+    pending = np.arange(n_frames)
+    for _ in range(maxcounts + 1):
+        surfaces[pending] = least_asymmetry_surface(
+            frames[pending], ycenters[pending], xcenters[pending],
+            asym_rad=asym_rad, asym_size=asym_size
+        )
+
+        ymin, xmin = np.unravel_index(
+            surfaces[pending].reshape(len(pending), -1).argmin(axis=1),
+            (n_side, n_side)
+        )
+        on_edge = (
+            (ymin == 0) | (ymin == n_side - 1) |
+            (xmin == 0) | (xmin == n_side - 1)
+        )
+
+        # Move the grids whose minimum is on the edge onto that minimum
+        moved = pending[on_edge]
+        ycenters[moved] = np.clip(
+            ycenters[moved] + ymin[on_edge] - asym_size,
+            half_box, ny - half_box - 1
+        )
+        xcenters[moved] = np.clip(
+            xcenters[moved] + xmin[on_edge] - asym_size,
+            half_box, nx - half_box - 1
+        )
+
+        pending = moved
+        if not len(pending):
+            break
+
+    success = np.ones(n_frames, dtype=bool)
+    success[pending] = False
+
+    inverted = surfaces.max(axis=(1, 2))[:, None, None] - surfaces
+    trial_y, trial_x = np.indices((n_side, n_side)) - asym_size
+
+    offsets = np.full((n_frames, 2), np.nan)
+    if method == 'gaus' and success.any():
+        offsets[success] = batched_gaussian_fit(
+            inverted[success], trial_y, trial_x
+        )[:, :2]
+    elif success.any():
+        # Center of light of the 3x3 trial centers around the maximum of the
+        #   inverted surface, above their lowest value
+        n_success = success.sum()
+        ypeak, xpeak = np.unravel_index(
+            inverted[success].reshape(n_success, -1).argmax(axis=1),
+            (n_side, n_side)
+        )
+        ypeak = np.clip(ypeak, 1, n_side - 2)
+        xpeak = np.clip(xpeak, 1, n_side - 2)
+        window_rng = np.arange(-1, 2)
+        windows = inverted[success][
+            np.arange(n_success)[:, None, None],
+            (ypeak[:, None] + window_rng)[:, :, None],
+            (xpeak[:, None] + window_rng)[:, None, :]
+        ]
+        weights = windows - windows.min(axis=(1, 2))[:, None, None]
+        total = weights.sum(axis=(1, 2))
+        window_y, window_x = np.indices((3, 3)) - 1
+        offsets[success, 0] = ypeak - asym_size + (
+            weights * window_y).sum(axis=(1, 2)) / total
+        offsets[success, 1] = xpeak - asym_size + (
+            weights * window_x).sum(axis=(1, 2)) / total
+
+    success &= np.all(np.isfinite(offsets), axis=1)
+    success &= np.all(np.abs(offsets) <= asym_size, axis=1)
+
+    centers = np.transpose([ycenters + offsets[:, 0], xcenters + offsets[:, 1]])
+    centers[~success] = np.nan
+
+    return centers, success
+
+
+def least_asymmetry_cascade(
+        frames, yguess, xguess, options=LEAST_ASYMMETRY_OPTIONS, maxcounts=2,
+        method='gaus'):
+    """ `least_asymmetry_centers` retried with each option on failed frames
+
+    Args:
+        frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        yguess (float): Initial row of the center in every frame.
+        xguess (float): Initial column of the center in every frame.
+        options (tuple, optional): (square, asym_rad, asym_size) settings,
+            tried in order. Defaults to LEAST_ASYMMETRY_OPTIONS.
+        maxcounts (int, optional): As in `least_asymmetry_centers`.
+            Defaults to 2.
+        method (str, optional): As in `least_asymmetry_centers`.
+            Defaults to 'gaus'.
+
+    Returns:
+        tuple: (n_frames, 2) y and x centers, NaN where every option failed,
+            and the (n_frames,) index into `options` of the option that
+            succeeded, -1 where every option failed
+    """
+    centers = np.full((len(frames), 2), np.nan)
+    option_used = np.full(len(frames), -1)
+
+    failed = np.arange(len(frames))
+    for k_option, (square, asym_rad, asym_size) in enumerate(options):
+        if not len(failed):
+            break
+
+        centers_now, success = least_asymmetry_centers(
+            frames[failed],
+            yguess,
+            xguess,
+            asym_rad=asym_rad,
+            asym_size=asym_size,
+            maxcounts=maxcounts,
+            method=method,
+            square=square
+        )
+
+        centers[failed[success]] = centers_now[success]
+        option_used[failed[success]] = k_option
+        failed = failed[~success]
+
+    return centers, option_used
+
+
+def gaussian_init_params_cube(sub_frames, yy, xx):
+    """ Initial 2D Gaussian parameters of every frame from its moments
+
+    Args:
+        sub_frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        yy (np.ndarray): (ny, nx) row coordinates of the pixels.
+        xx (np.ndarray): (ny, nx) column coordinates of the pixels.
+
+    Returns:
+        np.ndarray: (n_frames, 6) height, center_y, center_x, width_y,
+            width_x, offset
+    """
+    offset = np.median(sub_frames, axis=(1, 2))
+    weights = np.clip(sub_frames - offset[:, None, None], 0, None)
+    total = weights.sum(axis=(1, 2))
+    total[total == 0] = 1.
+
+    center_y = (weights * yy).sum(axis=(1, 2)) / total
+    center_x = (weights * xx).sum(axis=(1, 2)) / total
+
+    width_y = np.sqrt(
+        (weights * (yy - center_y[:, None, None])**2).sum(axis=(1, 2)) / total
+    )
+    width_x = np.sqrt(
+        (weights * (xx - center_x[:, None, None])**2).sum(axis=(1, 2)) / total
+    )
+
+    height = sub_frames.max(axis=(1, 2)) - offset
+
+    return np.transpose([
+        height,
+        center_y,
+        center_x,
+        np.maximum(width_y, 0.5),
+        np.maximum(width_x, 0.5),
+        offset
+    ])
+
+
+def batched_gaussian_fit(
+        sub_frames, yy, xx, init_params=None, bounds=None, max_iter=100,
+        ftol=1e-10, xtol=1e-10, batch_size=4096):
+    """ Levenberg-Marquardt fit of a 2D Gaussian to every frame at once
+
+    All frames of a batch are iterated together: the residuals and analytic
+    Jacobians are evaluated as array operations and the 6x6 damped normal
+    equations are solved in one batched call. Frames that converged are
+    masked out of the following iterations.
+
+    Args:
+        sub_frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        yy (np.ndarray): (ny, nx) row coordinates of the pixels.
+        xx (np.ndarray): (ny, nx) column coordinates of the pixels.
+        init_params (np.ndarray, optional): (6,) or (n_frames, 6) initial
+            height, center_y, center_x, width_y, width_x, offset.
+            Defaults to None, i.e. `gaussian_init_params_cube`.
+        bounds (tuple, optional): ((6,) lower, (6,) upper) bounds of the
+            parameters. Defaults to None, i.e. positive heights and widths.
+        max_iter (int, optional): Maximum number of iterations.
+            Defaults to 100.
+        ftol (float, optional): Relative change of chi-squared at which a
+            frame has converged. Defaults to 1e-10.
+        xtol (float, optional): Relative size of the step at which a frame
+            has converged. Defaults to 1e-10.
+        batch_size (int, optional): Number of frames per batch; bounds the
+            memory of the (batch_size, ny * nx, 6) Jacobian.
+            Defaults to 4096.
+
+    Returns:
+        np.ndarray: (n_frames, 6) center_y, center_x, width_y, width_x,
+            height, offset; the order of `lmfit_one_center`
+    """
+    n_frames = len(sub_frames)
+    yy = np.ravel(yy).astype(float)
+    xx = np.ravel(xx).astype(float)
+
+    if init_params is None:
+        init_params = gaussian_init_params_cube(
+            sub_frames, yy.reshape(sub_frames.shape[1:]),
+            xx.reshape(sub_frames.shape[1:])
+        )
+
+    params_all = np.broadcast_to(
+        np.asarray(init_params, dtype=float), (n_frames, 6)
+    ).copy()
+
+    if bounds is None:
+        bounds = (
+            [0., -np.inf, -np.inf, 1e-3, 1e-3, -np.inf],
+            [np.inf, np.inf, np.inf, np.inf, np.inf, np.inf]
+        )
+    lower, upper = np.asarray(bounds[0], float), np.asarray(bounds[1], float)
+
+    def model_and_jacobian(params):
+        height, center_y, center_x, width_y, width_x, offset = params.T[
+            :, :, None
+        ]
+        dy = yy - center_y
+        dx = xx - center_x
+        expo = np.exp(-0.5 * ((dy / width_y)**2 + (dx / width_x)**2))
+        h_expo = height * expo
+
+        jacobian = np.stack([
+            expo,
+            h_expo * dy / width_y**2,
+            h_expo * dx / width_x**2,
+            h_expo * dy**2 / width_y**3,
+            h_expo * dx**2 / width_x**3,
+            np.ones_like(expo)
+        ], axis=-1)
+
+        return h_expo + offset, jacobian
+
+    def chi_squared(data, params):
+        model, _ = model_and_jacobian(params)
+        return ((data - model)**2).sum(axis=1)
+
+    for start in range(0, n_frames, batch_size):
+        batch = slice(start, start + batch_size)
+        data = sub_frames[batch].reshape(len(params_all[batch]), -1)
+        params = params_all[batch]
+
+        damping = np.full(len(params), 1e-3)
+        chisq = chi_squared(data, params)
+        active = np.ones(len(params), dtype=bool)
+
+        for _ in range(max_iter):
+            if not active.any():
+                break
+
+            idx = np.where(active)[0]
+            model, jacobian = model_and_jacobian(params[idx])
+            residuals = data[idx] - model
+
+            jtj = np.einsum('nmi,nmj->nij', jacobian, jacobian)
+            jtr = np.einsum('nmi,nm->ni', jacobian, residuals)
+
+            # Marquardt damping scales with the diagonal of J^T J
+            diag = np.einsum('nii->ni', jtj)
+            lhs = jtj.copy()
+            lhs[:, np.arange(6), np.arange(6)] += damping[idx, None] * diag
+
+            try:
+                step = np.linalg.solve(lhs, jtr[..., None])[..., 0]
+            except np.linalg.LinAlgError:
+                # i.e. a flat frame with zero height; pinv handles singular
+                step = (np.linalg.pinv(lhs) @ jtr[..., None])[..., 0]
+
+            trial = np.clip(params[idx] + step, lower, upper)
+            trial_chisq = chi_squared(data[idx], trial)
+
+            improved = trial_chisq < chisq[idx]
+            accepted = idx[improved]
+            rejected = idx[~improved]
+
+            relative_change = (chisq[accepted] - trial_chisq[improved]) / \
+                np.maximum(chisq[accepted], np.finfo(float).tiny)
+            relative_step = np.abs(step[improved]).max(axis=1) / (
+                np.abs(params[accepted]).max(axis=1) + xtol
+            )
+
+            params[accepted] = trial[improved]
+            chisq[accepted] = trial_chisq[improved]
+            damping[accepted] /= 10.
+            damping[rejected] *= 10.
+
+            converged = (relative_change <= ftol) | (relative_step <= xtol)
+            active[accepted[converged]] = False
+            # A step that cannot lower chi-squared even with heavy damping
+            active[rejected[damping[rejected] > 1e10]] = False
+
+        params_all[batch] = params
+
+    height, center_y, center_x, width_y, width_x, offset = params_all.T
+
+    return np.transpose([center_y, center_x, width_y, width_x, height, offset])
+
+
 def lmfit_one_center(
         image, yy, xx, gfit_model, lmfit_init_params, yupper, ylower, xupper,
-        xlower, use_moments=True, n_sig=None, method='leastsq'):
+        xlower, use_moments=True, n_sig=None, method='leastsq',
+        use_jacobian=True, init_values=None, return_status=False):
     """Class methods are similar to regular functions.
 
     Note:
@@ -1195,28 +2394,56 @@ def lmfit_one_center(
     if n_sig is not None:
         sub_frame_now = gaussianFilter(sub_frame_now, n_sig)
 
-    init_params = moments(sub_frame_now) if use_moments else list(
-        lmfit_init_params.valuesdict().values())
+    if init_values is not None:
+        # Precomputed per frame, i.e. from `moments_cube`, in image coordinates
+        init_params = list(init_values)
+    elif use_moments:
+        # `moments` returns its centers swapped and in subframe coordinates,
+        #   while `yy` and `xx` are the pixel coordinates of the image
+        height, xcenter, ycenter, width_y, width_x, offset = moments(
+            sub_frame_now)
+        init_params = [
+            height, ycenter + ylower, xcenter + xlower,
+            width_y, width_x, offset
+        ]
+    else:
+        init_params = list(lmfit_init_params.valuesdict().values())
 
     n_params = 6
     ihg, iyc, ixc, iyw, ixw, ibg = np.arange(n_params)
 
-    lmfit_init_params.height = init_params[ihg]
-    lmfit_init_params.center_y = init_params[iyc]
-    lmfit_init_params.center_x = init_params[ixc]
-    lmfit_init_params.width_y = init_params[iyw]
-    lmfit_init_params.width_x = init_params[ixw]
-    lmfit_init_params.offset = init_params[ibg]
+    lmfit_init_params['height'].set(value=init_params[ihg])
+    lmfit_init_params['center_y'].set(value=init_params[iyc])
+    lmfit_init_params['center_x'].set(value=init_params[ixc])
+    lmfit_init_params['width_y'].set(value=init_params[iyw])
+    lmfit_init_params['width_x'].set(value=init_params[ixw])
+    lmfit_init_params['offset'].set(value=init_params[ibg])
 
     # print(lmfit_init_params)
 
+    fit_kws = None
+    if use_jacobian and method == 'leastsq':
+        # Analytic derivatives in place of finite differences; lmfit passes
+        #   the residual arguments (data, weights) and independent variables
+        #   and its residual is (data - model), hence the negative Jacobian
+        def gaussian_dfun(params, data, weights, yy, xx, **kwargs):
+            jacobian = -gaussian_jacobian(
+                **params.valuesdict(), yy=yy, xx=xx
+            ).reshape(6, -1)
+            if weights is not None:
+                jacobian = jacobian * np.ravel(weights)
+            return jacobian
+
+        fit_kws = {'Dfun': gaussian_dfun, 'col_deriv': True}
+
     gfit_res = gfit_model.fit(
-        sub_frame_now, params=lmfit_init_params, xx=xx, yy=yy, method=method)
+        sub_frame_now, params=lmfit_init_params, xx=xx, yy=yy, method=method,
+        fit_kws=fit_kws)
     # print(list(gfit_res.best_values.values()))
 
     fit_values = gfit_res.best_values
 
-    return (
+    fit_params = (
         fit_values['center_y'],
         fit_values['center_x'],
         fit_values['width_y'],
@@ -1225,6 +2452,171 @@ def lmfit_one_center(
         fit_values['offset']
     )
 
+    if return_status:
+        # Whether the minimizer converged, and its number of evaluations
+        return fit_params + (float(gfit_res.success), float(gfit_res.nfev))
+
+    return fit_params
+
+
+# Bit flags of `gaussian_fit_flags`
+GAUSSIAN_FIT_NONFINITE = 1
+GAUSSIAN_FIT_AT_BOUND = 2
+GAUSSIAN_FIT_HIGH_CHI2 = 4
+GAUSSIAN_FIT_CENTER_OUTLIER = 8
+GAUSSIAN_FIT_NOT_CONVERGED = 16
+
+
+def gaussian_fit_chi2(sub_frames, yy, xx, fit_params):
+    """ Mean squared residual of the Gaussian fit of every frame
+
+    Args:
+        sub_frames (np.ndarray): (n_frames, ny, nx) stack that was fit.
+        yy (np.ndarray): (ny, nx) row coordinates of the pixels.
+        xx (np.ndarray): (ny, nx) column coordinates of the pixels.
+        fit_params (np.ndarray): (n_frames, 6) center_y, center_x, width_y,
+            width_x, height, offset; the order of `lmfit_one_center`
+
+    Returns:
+        np.ndarray: (n_frames,) mean squared residuals
+    """
+    center_y, center_x, width_y, width_x, height, offset = np.asarray(
+        fit_params, dtype=float).T[:, :, None, None]
+
+    with np.errstate(invalid='ignore', over='ignore', divide='ignore'):
+        # `gaussian` casts its widths to float, so broadcast here instead
+        chi_y = (center_y - yy) / width_y
+        chi_x = (center_x - xx) / width_x
+        model = height * np.exp(-0.5*(chi_y**2 + chi_x**2)) + offset
+        return ((sub_frames - model)**2).mean(axis=(1, 2))
+
+
+def gaussian_fit_flags(
+        fit_params, chi2, lower, upper, chi2_limit, center_median,
+        center_scale, n_sig=5., success=None):
+    """ Bit flags of the quality of the Gaussian fit of every frame
+
+    GAUSSIAN_FIT_NONFINITE: a parameter or the residual is not finite,
+    GAUSSIAN_FIT_AT_BOUND: a parameter sits on one of its bounds,
+    GAUSSIAN_FIT_HIGH_CHI2: the mean squared residual exceeds `chi2_limit`,
+    GAUSSIAN_FIT_CENTER_OUTLIER: the center is more than `n_sig` scales from
+    `center_median`,
+    GAUSSIAN_FIT_NOT_CONVERGED: the minimizer did not report success.
+
+    Args:
+        fit_params (np.ndarray): (n_frames, 6) center_y, center_x, width_y,
+            width_x, height, offset; the order of `lmfit_one_center`
+        chi2 (np.ndarray): (n_frames,) mean squared residuals.
+        lower (np.ndarray): (6,) lower bounds of the parameters.
+        upper (np.ndarray): (6,) upper bounds of the parameters.
+        chi2_limit (float): Largest acceptable mean squared residual.
+        center_median (np.ndarray): (2,) typical y and x center.
+        center_scale (np.ndarray): (2,) typical y and x center scatter;
+            raised to the machine epsilon, so identical centers never
+            divide by zero.
+        n_sig (float, optional): Center outlier distance in scales.
+            Defaults to 5.
+        success (np.ndarray, optional): (n_frames,) convergence of each fit,
+            i.e. from `return_status` of `lmfit_one_center`.
+            Defaults to None, i.e. not checked.
+
+    Returns:
+        np.ndarray: (n_frames,) bit flags; 0 for a good fit
+    """
+    fit_params = np.asarray(fit_params, dtype=float)
+    center_scale = np.maximum(center_scale, np.finfo(float).eps)
+    flags = np.zeros(len(fit_params), dtype=int)
+
+    nonfinite = ~np.all(np.isfinite(fit_params), axis=1) | ~np.isfinite(chi2)
+    flags[nonfinite] |= GAUSSIAN_FIT_NONFINITE
+
+    with np.errstate(invalid='ignore'):
+        at_bound = (
+            np.isclose(fit_params, lower, rtol=0, atol=1e-6) |
+            np.isclose(fit_params, upper, rtol=0, atol=1e-6)
+        )
+        flags[at_bound.any(axis=1)] |= GAUSSIAN_FIT_AT_BOUND
+
+        flags[chi2 > chi2_limit] |= GAUSSIAN_FIT_HIGH_CHI2
+
+        distance_sq = (
+            ((fit_params[:, :2] - center_median) / center_scale)**2
+        ).sum(axis=1)
+        flags[distance_sq > n_sig**2] |= GAUSSIAN_FIT_CENTER_OUTLIER
+
+    if success is not None:
+        flags[~np.asarray(success, dtype=bool)] |= GAUSSIAN_FIT_NOT_CONVERGED
+
+    return flags
+
+
+def lmfit_block_centers(
+        image_block, init_values_block, yy, xx, gfit_model, lmfit_init_params,
+        yupper, ylower, xupper, xlower, n_sig=None, method='leastsq',
+        use_jacobian=True, warm_start=True, return_status=False):
+    """ `lmfit_one_center` over a contiguous block of frames
+
+    With `warm_start`, only the first frame is seeded from its initial
+    values; every other fit starts from the solution of the previous frame,
+    which is nearly identical for consecutive frames and converges in fewer
+    iterations. A non-finite solution re-seeds the next frame from its own
+    initial values.
+
+    Args:
+        image_block (np.ndarray): Consecutive frames (n_frames, ny, nx).
+        init_values_block (np.ndarray): (n_frames, 6) initial height,
+            center_y, center_x, width_y, width_x, offset in image coordinates,
+            i.e. from `moments_cube`. None seeds from `moments` per frame.
+        yy, xx, gfit_model, lmfit_init_params, yupper, ylower, xupper,
+            xlower, n_sig, method, use_jacobian: As in `lmfit_one_center`.
+        warm_start (bool, optional): Seed each fit from the previous frame.
+            Defaults to True.
+        return_status (bool, optional): Append the success (1 or 0) and the
+            number of function evaluations of each fit. Defaults to False.
+
+    Returns:
+        np.ndarray: (n_frames, 6) center_y, center_x, width_y, width_x,
+            height, offset per frame; (n_frames, 8) with `return_status`
+    """
+    lmfit_init_params = lmfit_init_params.copy()
+    param_names = ['center_y', 'center_x', 'width_y', 'width_x', 'height',
+                   'offset']
+
+    n_columns = len(param_names) + (2 if return_status else 0)
+    block_params = np.zeros((len(image_block), n_columns))
+    reseed = True
+    for kf, image in enumerate(image_block):
+        init_values = None
+        if reseed and init_values_block is not None:
+            init_values = init_values_block[kf]
+
+        block_params[kf] = lmfit_one_center(
+            image,
+            yy=yy,
+            xx=xx,
+            gfit_model=gfit_model,
+            lmfit_init_params=lmfit_init_params,
+            yupper=yupper,
+            ylower=ylower,
+            xupper=xupper,
+            xlower=xlower,
+            use_moments=reseed,
+            n_sig=n_sig,
+            method=method,
+            use_jacobian=use_jacobian,
+            init_values=init_values,
+            return_status=return_status
+        )
+
+        reseed = not (
+            warm_start and np.all(np.isfinite(block_params[kf, :6]))
+        )
+        if not reseed:
+            for name, value in zip(param_names, block_params[kf]):
+                lmfit_init_params[name].set(value=value)
+
+    return block_params
+
 
 # TODO Rename this here and in `fit_gauss`
 def print_model_params(model, init_params):
@@ -1274,7 +2666,7 @@ def fit_gauss(sub_frame_now, xinds, yinds, init_params, print_compare=False):
 
 def fit_one_center(
         image, ylower, yupper, xlower, xupper,
-        n_sig=None, method='gaussian', b_size=7):
+        n_sig=None, method='gaussian', b_size=7, init_params=None):
     """Class methods are similar to regular functions.
 
     Note:
@@ -1302,7 +2694,7 @@ def fit_one_center(
         return np.array(moments(sub_frame_now))  # H, Xc, Yc, Xs, Ys, O
     if method == 'gaussian':
         # , xinds, yinds, np.copy(cmom)) # H, Xc, Yc, Xs, Ys, Th, O
-        return fitgaussian(sub_frame_now)
+        return fitgaussian(sub_frame_now, params=init_params)
     if method == 'fluxweighted':
         return flux_weighted_centroid(
             image,
@@ -1771,34 +3163,458 @@ def dbscan_segmented_pld(
     return dbs_pld_pred == dbs_clean
 
 
-def cross_correlation_hst_diff_ndr():
-    # Cross correlated the differential non-destructive reads
-    #   from HST Scanning mode with WFC3 and G141
-    fitsfiles = glob("*ima*fits")
-
-    ylow = 50
-    yhigh = 90
-    nExts = 36
-    extGap = 5
-
-    shifts_ndr = np.zeros((len(fitsfiles), (nExts-1)//extGap, 2))
-    fitsfile0 = fits.open(fitsfiles[0])
-    for kf, fitsfilenow in enumerate(fitsfiles):
-        fitsnow = fits.open(fitsfilenow)
-        for kndr in range(extGap+1, nExts+1)[::extGap][::-1]:
-            fits0_dndrnow = fitsfile0[kndr-extGap].data[ylow:yhigh] - \
-                fitsfile0[kndr].data[ylow:yhigh]
-            fitsN_dndrnow = fitsnow[kndr-extGap].data[ylow:yhigh] - \
-                fitsnow[kndr].data[ylow:yhigh]
-
-            idx_ = (kndr-1)//extGap - 1
-            shifts_ndr[kf][idx_] = ir.chi2_shift(fits0_dndrnow, fitsN_dndrnow)
-            shifts_ndr[kf][idx_] = shifts_ndr[kf][idx_][:2]
-
-            # ax.clear()
-            # plt.imshow(fitsN_dndrnow)
-            # ax.set_aspect('auto')
-            # plt.pause(1e-3)
-
-    plt.plot(shifts_ndr[:, :-1, 0], 'o')  # x-shifts
-    plt.plot(shifts_ndr[:, :-1, 1], 'o')  # y-shifts
+def upsampled_dft_batch(data, region_size, upsample_factor, offsets):
+    """ Upsampled inverse DFT of a stack, only within a small region
+
+    Matrix-multiply DFT of Guizar-Sicairos et al. (2008), evaluated for every
+    frame of the stack at once.
+
+    Args:
+        data (np.ndarray): (n_frames, ny, nx) complex spectra.
+        region_size (int): Size of the upsampled region in upsampled pixels.
+        upsample_factor (int): Upsampling factor.
+        offsets (np.ndarray): (n_frames, 2) (y, x) offsets of the region.
+
+    Returns:
+        np.ndarray: (n_frames, region_size, region_size) upsampled images
+    """
+    n_y, n_x = data.shape[-2:]
+    upsampled = np.arange(region_size)[:, None]
+    freqs_y = np.fft.fftfreq(n_y, upsample_factor)
+    freqs_x = np.fft.fftfreq(n_x, upsample_factor)
+
+    # exp(-2j pi (u - offset) f) = exp(-2j pi u f) * exp(2j pi offset f): the
+    #   first factor is shared by all frames, such that each axis is one
+    #   matrix product over the whole stack
+    kernel_y = np.exp(-2j * np.pi * upsampled * freqs_y)
+    kernel_x = np.exp(-2j * np.pi * upsampled * freqs_x)
+    phase_y = np.exp(2j * np.pi * offsets[:, 0, None] * freqs_y)
+    phase_x = np.exp(2j * np.pi * offsets[:, 1, None] * freqs_x)
+
+    data = (data * phase_x[:, None, :]) @ kernel_x.T
+
+    return kernel_y @ (data * phase_y[:, :, None])
+
+
+def batched_cross_correlation_shifts(
+        frames, reference=None, upsample_factor=100, normalization=None,
+        batch_size=1024):
+    """ Shifts of a stack of frames with respect to a reference frame
+
+    All frames in a batch are cross correlated with the reference in one
+    batched FFT; each peak is then refined to 1 / `upsample_factor` pixels
+    with a batched upsampled DFT around the integer peak.
+
+    Args:
+        frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        reference (np.ndarray, optional): (ny, nx) reference frame, or a
+            (n_frames, ny, nx) stack with one reference per frame.
+            Defaults to None, i.e. the median frame.
+        upsample_factor (int, optional): Sub-pixel precision is
+            1 / `upsample_factor`. Defaults to 100.
+        normalization (str, optional): 'phase' for phase correlation or
+            None for plain cross-correlation. Phase correlation weights the
+            noisy high frequencies as much as the signal, which biases the
+            shifts of noisy or compact images. Defaults to None.
+        batch_size (int, optional): Number of frames per batched FFT; bounds
+            the memory use. Defaults to 1024.
+
+    Returns:
+        np.ndarray: (n_frames, 2) (y, x) shifts; the content of frame k is
+            displaced by `shifts[k]` with respect to the reference
+    """
+    if reference is None:
+        reference = np.median(frames, axis=0)
+
+    reference_freq = np.fft.fft2(reference)
+
+    n_frames = len(frames)
+    frame_shape = np.array(frames.shape[-2:])
+    midpoints = np.fix(frame_shape / 2)
+
+    region_size = int(np.ceil(upsample_factor * 1.5))
+    dftshift = np.fix(region_size / 2.0)
+
+    shifts = np.zeros((n_frames, 2))
+    for start in range(0, n_frames, batch_size):
+        batch = slice(start, start + batch_size)
+
+        reference_now = reference_freq
+        if reference_freq.ndim == 3:
+            reference_now = reference_freq[batch]
+
+        image_product = reference_now * np.fft.fft2(frames[batch]).conj()
+        if normalization == 'phase':
+            image_product /= np.maximum(
+                np.abs(image_product), 100 * np.finfo(float).eps
+            )
+
+        cross_corr = np.abs(np.fft.ifft2(image_product))
+        n_now = cross_corr.shape[0]
+
+        peaks = np.unravel_index(
+            cross_corr.reshape(n_now, -1).argmax(axis=1), cross_corr.shape[1:]
+        )
+        batch_shifts = np.stack(peaks, axis=1).astype(float)
+
+        # Peaks past the midpoint are negative shifts (FFT wrap around)
+        batch_shifts = np.where(
+            batch_shifts > midpoints,
+            batch_shifts - frame_shape,
+            batch_shifts
+        )
+
+        if upsample_factor > 1:
+            batch_shifts = np.round(batch_shifts * upsample_factor) / \
+                upsample_factor
+
+            cross_corr = np.abs(upsampled_dft_batch(
+                image_product.conj(),
+                region_size,
+                upsample_factor,
+                dftshift - batch_shifts * upsample_factor
+            ))
+
+            peaks = np.unravel_index(
+                cross_corr.reshape(n_now, -1).argmax(axis=1),
+                cross_corr.shape[1:]
+            )
+            batch_shifts += (np.stack(peaks, axis=1) - dftshift) / \
+                upsample_factor
+
+        # The peak is the shift that registers a frame onto the reference;
+        #   the frame itself is displaced by the opposite shift
+        shifts[batch] = -batch_shifts
+
+    return shifts
+
+
+def epsf_template(sub_frames, ycenters, xcenters, oversample=4, n_refine=5):
+    """ Oversampled empirical PSF from the shift-and-add median of a stack
+
+    Every pixel of every frame is placed on a grid `oversample` times finer
+    than the pixels, at its offset from the center of its frame, and each
+    cell of the template is the median of the pixels that land in it. The
+    frames are background subtracted and normalized to unit flux first.
+    Each refinement adds the cell medians of the residuals from the template
+    interpolated at the exact offsets, which removes the scatter of the
+    pixels across the width of a cell. Cells of sub-pixel phases that the
+    pointing never sampled are filled by normalized Gaussian smoothing of
+    the sampled cells.
+
+    Args:
+        sub_frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        ycenters (np.ndarray): (n_frames,) rows of the centers in stack
+            coordinates.
+        xcenters (np.ndarray): (n_frames,) columns of the centers in stack
+            coordinates.
+        oversample (int, optional): Template cells per pixel. Defaults to 4.
+        n_refine (int, optional): Number of residual refinements.
+            Defaults to 5.
+
+    Returns:
+        np.ndarray: (2*oversample*(ny//2) + 1, 2*oversample*(nx//2) + 1)
+            template with the center in its middle cell
+    """
+    sub_frames = np.asarray(sub_frames, dtype=float)
+    ycenters = np.asarray(ycenters, dtype=float)
+    xcenters = np.asarray(xcenters, dtype=float)
+
+    # Frames without a center do not take part
+    use_frames = np.isfinite(ycenters) & np.isfinite(xcenters)
+    sub_frames = sub_frames[use_frames]
+    ycenters = ycenters[use_frames]
+    xcenters = xcenters[use_frames]
+
+    n_frames, ny, nx = sub_frames.shape
+    ycell0 = oversample * (ny // 2)
+    xcell0 = oversample * (nx // 2)
+    shape = (2 * ycell0 + 1, 2 * xcell0 + 1)
+
+    frames = sub_frames - np.median(sub_frames, axis=(1, 2))[:, None, None]
+    fluxes = frames.sum(axis=(1, 2))
+    frames /= np.where(fluxes > 0, fluxes, 1)[:, None, None]
+
+    # Offsets of every pixel from its center, in template cells
+    yinds, xinds = np.indices((ny, nx))
+    yoffsets = (yinds - ycenters[:, None, None]) * oversample + ycell0
+    xoffsets = (xinds - xcenters[:, None, None]) * oversample + xcell0
+    ycells = np.rint(yoffsets).astype(int)
+    xcells = np.rint(xoffsets).astype(int)
+
+    inside = (ycells >= 0) & (ycells < shape[0])
+    inside &= (xcells >= 0) & (xcells < shape[1])
+    yoffsets = yoffsets[inside]
+    xoffsets = xoffsets[inside]
+    values = frames[inside]
+
+    # Sort by cell once; the median of every cell then sorts within cells
+    cells = np.ravel_multi_index((ycells[inside], xcells[inside]), shape)
+    order = np.argsort(cells, kind='stable')
+    cells = cells[order]
+    yoffsets = yoffsets[order]
+    xoffsets = xoffsets[order]
+    values = values[order]
+
+    sampled_cells, starts, counts = np.unique(
+        cells, return_index=True, return_counts=True
+    )
+    sampled = np.zeros(shape, dtype=bool)
+    sampled.flat[sampled_cells] = True
+
+    coverage = sp.ndimage.gaussian_filter(
+        sampled.astype(float), 0.5 * oversample
+    )
+
+    def cell_medians(samples):
+        samples = samples[np.lexsort((samples, cells))]
+        medians = np.zeros(shape)
+        medians.flat[sampled_cells] = 0.5 * (
+            samples[starts + (counts - 1) // 2] + samples[starts + counts // 2]
+        )
+
+        if not sampled.all():
+            smoothed = sp.ndimage.gaussian_filter(medians, 0.5 * oversample)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                filled = np.nan_to_num(smoothed / coverage)
+
+            medians = np.where(sampled, medians, filled)
+
+        return medians
+
+    template = cell_medians(values)
+    for _ in range(n_refine):
+        model = sp.ndimage.map_coordinates(
+            template, [yoffsets, xoffsets], order=3, mode='nearest'
+        )
+        template += cell_medians(values - model)
+
+    return template
+
+
+def epsf_centers(
+        sub_frames, template, oversample=4, ycenters=None, xcenters=None,
+        upsample_factor=100, batch_size=1024):
+    """ Centers of every frame from cross correlation with an ePSF template
+
+    Each frame is cross correlated with the template sampled on the pixels of
+    that frame, with the template center on the template cell nearest to the
+    current center of the frame; see `batched_cross_correlation_shifts`. The
+    remaining shifts are a fraction of a cell, where the sub-pixel peak of the
+    cross correlation is least biased by the undersampled PSF.
+
+    Args:
+        sub_frames (np.ndarray): (n_frames, ny, nx) stack without NaNs.
+        template (np.ndarray): Template from `epsf_template`.
+        oversample (int, optional): Template cells per pixel of `template`.
+            Defaults to 4.
+        ycenters (np.ndarray, optional): (n_frames,) current rows of the
+            centers in stack coordinates. Defaults to None, i.e. the middle
+            row of the stack.
+        xcenters (np.ndarray, optional): (n_frames,) current columns of the
+            centers in stack coordinates. Defaults to None, i.e. the middle
+            column of the stack.
+        upsample_factor (int, optional): Sub-pixel precision is
+            1 / `upsample_factor`. Defaults to 100.
+        batch_size (int, optional): Number of frames per batched FFT.
+            Defaults to 1024.
+
+    Returns:
+        np.ndarray: (n_frames, 2) y and x centers in stack coordinates,
+            relative to the middle cell of `template`
+    """
+    sub_frames = np.asarray(sub_frames, dtype=float)
+    n_frames, ny, nx = sub_frames.shape
+    ycell0 = (template.shape[0] - 1) // 2
+    xcell0 = (template.shape[1] - 1) // 2
+
+    if ycenters is None or xcenters is None:
+        ycenters = np.full(n_frames, ny // 2)
+        xcenters = np.full(n_frames, nx // 2)
+
+    # Reference centers on the template cells, i.e. multiples of 1/oversample
+    yrefs = np.rint(
+        np.nan_to_num(ycenters, nan=ny // 2) * oversample) / oversample
+    xrefs = np.rint(
+        np.nan_to_num(xcenters, nan=nx // 2) * oversample) / oversample
+
+    ycells = np.rint(
+        (np.arange(ny) - yrefs[:, None]) * oversample).astype(int) + ycell0
+    xcells = np.rint(
+        (np.arange(nx) - xrefs[:, None]) * oversample).astype(int) + xcell0
+
+    # Pixels past the edge of the template take its edge cells
+    ycells = np.clip(ycells, 0, template.shape[0] - 1)
+    xcells = np.clip(xcells, 0, template.shape[1] - 1)
+    references = template[ycells[:, :, None], xcells[:, None, :]]
+
+    frames = sub_frames - np.median(sub_frames, axis=(1, 2))[:, None, None]
+    shifts = batched_cross_correlation_shifts(
+        frames,
+        reference=references,
+        upsample_factor=upsample_factor,
+        normalization=None,
+        batch_size=batch_size
+    )
+
+    return np.transpose([yrefs, xrefs]) + shifts
+
+
+def hst_ima_reads(hdul, crop=None):
+    """ Stack the non-destructive reads of an HST WFC3 ima file in time order
+
+    Reads stored as a rate (BUNIT ending in '/S') are converted to counts with
+    the SAMPTIME of each read.
+
+    Args:
+        hdul (fits.HDUList): Opened ima file.
+        crop (tuple, optional): (y slice, x slice) window of each read.
+            Defaults to None, i.e. full reads.
+
+    Returns:
+        tuple: (reads, errors, sample times in seconds), with the reads and
+            errors as (n_reads, ny, nx) arrays
+    """
+    ycrop, xcrop = (slice(None), slice(None)) if crop is None else crop
+
+    # EXTVER 1 is the final read; the zeroth read has the highest EXTVER
+    sci_hdus = sorted(
+        (hdu for hdu in hdul if hdu.name == 'SCI'),
+        key=lambda hdu: hdu.ver,
+        reverse=True
+    )
+
+    samptimes = np.array([hdu.header.get('SAMPTIME', 0.) for hdu in sci_hdus])
+    reads = np.stack([
+        hdu.data[ycrop, xcrop] for hdu in sci_hdus
+    ]).astype(np.float64)
+    errors = np.stack([
+        hdul['ERR', hdu.ver].data[ycrop, xcrop] for hdu in sci_hdus
+    ]).astype(np.float64)
+
+    if sci_hdus[0].header.get('BUNIT', '').upper().endswith('/S'):
+        reads *= samptimes[:, None, None]
+        errors *= samptimes[:, None, None]
+
+    return reads, errors, samptimes
+
+
+def hst_differenced_reads(hdul, crop=None):
+    """ Differences of consecutive non-destructive reads of an ima file
+
+    Args:
+        hdul (fits.HDUList): Opened ima file.
+        crop (tuple, optional): (y slice, x slice) window of each read.
+            Defaults to None, i.e. full reads.
+
+    Returns:
+        tuple: (differenced reads, their errors, mid times in seconds), with
+            one entry per pair of consecutive reads in time order
+    """
+    reads, errors, samptimes = hst_ima_reads(hdul, crop=crop)
+
+    diffs = np.diff(reads, axis=0)
+    diff_errors = np.sqrt(errors[1:]**2 + errors[:-1]**2)
+    diff_times = 0.5 * (samptimes[1:] + samptimes[:-1])
+
+    return diffs, diff_errors, diff_times
+
+
+def hst_ndr_shifts(fits_name, reference_diffs, ylow=50, yhigh=90,
+                   upsample_factor=100):
+    """ Shifts of the differenced reads of one ima file w.r.t. a reference
+
+    Args:
+        fits_name (str): Path to the ima file.
+        reference_diffs (np.ndarray): (n_diffs, ny, nx) differenced reads of
+            the reference file within rows `ylow`:`yhigh`, one per
+            differenced read of `fits_name`, or one (ny, nx) differenced read
+            for all of them.
+        ylow (int, optional): First row of the scan. Defaults to 50.
+        yhigh (int, optional): Last row (excluded) of the scan.
+            Defaults to 90.
+        upsample_factor (int, optional): Sub-pixel precision of the
+            cross-correlation is 1 / `upsample_factor`. Defaults to 100.
+
+    Returns:
+        np.ndarray: (n_diffs, 2) x and y shifts
+    """
+    with fits.open(fits_name) as hdul:
+        diffs, _, _ = hst_differenced_reads(
+            hdul, crop=(slice(ylow, yhigh), slice(None))
+        )
+
+    reference_diffs = np.asarray(reference_diffs)
+    if reference_diffs.ndim == 3 and len(reference_diffs) != len(diffs):
+        raise ValueError(
+            f'{fits_name} has {len(diffs)} differenced reads, but there are '
+            f'{len(reference_diffs)} reference differenced reads; use one '
+            f'reference differenced read for files with another NSAMP'
+        )
+
+    # Cross correlate every differenced read with its reference at once
+    shifts_yx = batched_cross_correlation_shifts(
+        diffs,
+        reference=reference_diffs,
+        upsample_factor=upsample_factor,
+        normalization=None
+    )
+
+    return shifts_yx[:, ::-1]
+
+
+def cross_correlation_hst_diff_ndr(
+        fits_names=None, ylow=50, yhigh=90, upsample_factor=100,
+        num_cores=cpu_count()-1):
+    """ Cross correlate the differenced non-destructive reads of HST scans
+
+    The differenced reads of HST WFC3/G141 scanning mode files are cross
+    correlated with those of the first file, with one file per process.
+    When the files do not all have the same NSAMP, every differenced read
+    is cross correlated with the middle differenced read of the first file
+    instead.
+
+    Args:
+        fits_names (list, optional): Paths to the ima files.
+            Defaults to None, i.e. `*ima*fits` in the current directory.
+        ylow (int, optional): First row of the scan. Defaults to 50.
+        yhigh (int, optional): Last row (excluded) of the scan.
+            Defaults to 90.
+        upsample_factor (int, optional): Sub-pixel precision of the
+            cross-correlation is 1 / `upsample_factor`. Defaults to 100.
+        num_cores (int, optional): Number of processes.
+            Defaults to cpu_count()-1.
+
+    Returns:
+        np.ndarray or list: (n_files, n_diffs, 2) x and y shifts in time
+            order, or a list of (n_diffs, 2) shifts per file when the files
+            have different NSAMP
+    """
+    if fits_names is None:
+        fits_names = sorted(glob("*ima*fits"))
+
+    with fits.open(fits_names[0]) as hdul:
+        reference_diffs, _, _ = hst_differenced_reads(
+            hdul, crop=(slice(ylow, yhigh), slice(None))
+        )
+
+    n_samps = {fits.getheader(fname)['NSAMP'] for fname in fits_names}
+    same_nsamp = len(n_samps) == 1
+    if not same_nsamp:
+        print(
+            f'The files have NSAMP in {sorted(n_samps)}; cross correlating '
+            f'with one differenced read of {fits_names[0]}'
+        )
+        reference_diffs = reference_diffs[len(reference_diffs) // 2]
+
+    func = partial(
+        hst_ndr_shifts,
+        reference_diffs=reference_diffs,
+        ylow=ylow,
+        yhigh=yhigh,
+        upsample_factor=upsample_factor
+    )
+
+    shifts_ndr = pool_run_func(func, zip(fits_names), num_cores=num_cores)
+
+    return np.array(shifts_ndr) if same_nsamp else list(shifts_ndr)
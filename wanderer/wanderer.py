@@ -3,6 +3,7 @@ import numpy as np
 # import matplotlib.pyplot as plt
 import os
 import pandas as pd
+import weakref
 # import scipy as sp
 # import sys
 
@@ -10,9 +11,12 @@ import pandas as pd
 
 from astropy.io import fits
 # from astropy.modeling import models, fitting
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import partial
-from glob import glob
+from io import BytesIO
+from itertools import repeat
 from lmfit import Model, Parameters
 from multiprocessing import cpu_count, Pool
 from photutils.aperture import (
@@ -26,6 +30,7 @@ from photutils.aperture import (
 # from sklearn.preprocessing import StandardScaler
 # from skimage.filters import gaussian as gaussianFilter
 # from socket import gethostname
+from scipy.ndimage import median_filter
 from statsmodels.robust import scale
 from statsmodels.nonparametric import kde
 from time import time, localtime  # , sleep
@@ -36,27 +41,54 @@ from tqdm import tqdm, tqdm_notebook
 # from .utils import *
 from .utils import (
     # actr,
+    allocate_cube,
+    append_to_cube,
+    batched_cross_correlation_shifts,
+    batched_gaussian_fit,
     clip_outlier,
     command_line_inputs,
     compute_flux_one_frame,
     create_aper_mask,
+    cross_correlation_hst_diff_ndr,
+    cube_cache_key,
     dbscan_flux,
     dbscan_pld,
     dbscan_segmented_flux,
+    epsf_centers,
+    epsf_template,
+    fill_nans_with_frame_median,
+    first_data_hdu,
     fit_gauss,
     fitgaussian,
     fit_one_center,
-    flux_weighted_centroid,
+    flux_weighted_centroid_cube,
     gaussian,
+    gaussian_fit_chi2,
+    gaussian_fit_flags,
+    GAUSSIAN_FIT_HIGH_CHI2,
     get_julian_date_from_header,
+    glob_fits_files,
     grab_dir_and_filenames,
+    hst_differenced_reads,
+    LEAST_ASYMMETRY_OPTIONS,
+    least_asymmetry_cascade,
+    least_asymmetry_fitted_options,
+    lmfit_block_centers,
     lmfit_one_center,
+    load_cube_cache,
+    load_header_index,
     measure_one_annular_bg,
     measure_one_circle_bg,
     measure_one_median_bg,
     measure_one_kde_bg,
     moments,
+    moments_cube,
     pool_run_func,
+    prefetch,
+    quadratic_peak_centers,
+    read_file_bytes,
+    save_cube_cache,
+    uncertainty_filename,
     WandererCLI
 )
 
@@ -79,10 +111,70 @@ class Wanderer(object):
     """
     day2sec = 86400.
 
+    # Prefixes of the `centering_df` center columns, i.e. 'fluxweighted'
+    #   for 'fluxweighted_ycenters' and 'fluxweighted_xcenters'
+    centering_options = (
+        'gaussian_fit',
+        'gaussian_mom',
+        'fluxweighted',
+        'least_asym',
+        'cross_corr',
+        'quadratic',
+        'ePSF',
+    )
+
+    # Escalating re-fits of flagged Gaussian fits, tried in order:
+    #   (lmfit method, extra subframe half width, median filter size)
+    gaussian_refit_strategies = (
+        ('least_squares', 0, None),
+        ('leastsq', 2, None),
+        ('leastsq', 0, 3),
+    )
+
+    # Per-frame arrays that are stored next to the per-frame dataframes
+    per_frame_arrays = (
+        'centering_gaussian_fit',
+        'widths_gaussian_fit',
+        'heights_gaussian_fit',
+        'background_gaussian_fit',
+        'centering_fluxweight',
+        'centering_least_asym',
+        'centering_cross_corr',
+        'centering_quadratic',
+        'centering_ePSF',
+        'effective_widths',
+        'quadrature_widths',
+        'background_circle_mask',
+        'background_annulus',
+        'background_median_mask',
+        'background_kde_univ',
+    )
+
+    # Per-instance references of the centering methods, which are reused for
+    #   the frames of `append_fits_files`
+    centering_references = (
+        'cross_corr_reference',
+        'cross_corr_zero_point',
+        'cross_corr_corner',
+        'epsf',
+        'epsf_oversample',
+        'epsf_reference',
+        'epsf_scale',
+        'epsf_zero_point',
+    )
+
+    tso_dataframes = (
+        'centering_df',
+        'background_df',
+        'flux_tso_df',
+        'noise_tso_df'
+    )
+
     def __init__(
             self, fits_file_dir='./', filetype='slp.fits', telescope=None,
             yguess=None, xguess=None, pix_rad=5, method='mean', num_cores=None,
-            jupyter=False):
+            jupyter=False, cube_dtype=np.float64, memmap_dir=None,
+            use_header_index=False):
         """Example of docstring on the __init__ method.
 
                 The __init__ method may be documented in either the class level
@@ -99,6 +191,13 @@ class Wanderer(object):
                     param2 (:obj:`int`, optional): Description of `param2`. Multiple
                         lines are supported.
                     param3 (:obj:`list` of :obj:`str`): Description of `param3`.
+                    cube_dtype (np.dtype, optional): Data type of `image_cube`
+                        and `noise_cube`; i.e. np.float32 halves the memory.
+                        Defaults to np.float64.
+                    memmap_dir (str, optional): If given, `image_cube` and
+                        `noise_cube` are stored as disk-backed `np.memmap`
+                        arrays in this directory instead of in RAM.
+                        Defaults to None.
 
         """
         print('\n\n** Not all who wander are lost **\n\n')
@@ -107,6 +206,17 @@ class Wanderer(object):
         self.tqdm = tqdm_notebook if jupyter else tqdm
         self.method = method
         self.filetype = filetype
+        self.cube_dtype = cube_dtype
+        self.memmap_dir = memmap_dir
+
+        # Backing files of the memmap cubes of this instance; see `close`
+        self.memmap_files = []
+
+        # (y, x) detector pixel of the cube origin; see `crop_slices`
+        self.crop_offset = np.zeros(2, dtype=int)
+
+        # Set by the loaders once every NaN in `image_cube` has been filled
+        self.nan_free = False
 
         if method == 'mean':
             self.metric = np.nanmean
@@ -118,7 +228,17 @@ class Wanderer(object):
             )
 
         self.fits_file_dir = fits_file_dir
-        self.fits_names = glob(f'{self.fits_file_dir}/*{self.filetype}')
+        self.use_header_index = use_header_index
+        self.header_index = None
+        if self.use_header_index:
+            self.fits_names, self.header_index = load_header_index(
+                self.fits_file_dir, self.filetype
+            )
+        else:
+            self.fits_names = glob_fits_files(
+                self.fits_file_dir, self.filetype
+            )
+
         # self.fits_names = glob(self.fits_file_dir + '/*' + self.filetype)
         self.n_slope_files = len(self.fits_names)
 
@@ -176,7 +296,200 @@ class Wanderer(object):
             str(tm_hour) + 'h' + str(tm_min) + 'm' + str(tm_sec) + 's'
         )
 
-    def jwst_load_fits_file(self):
+    def allocate_cubes(self, cube_shape):
+        """ Allocate `image_cube`, `noise_cube`, and `time_cube`
+
+        The image and noise cubes use `self.cube_dtype` and are disk-backed
+        `np.memmap` arrays when `self.memmap_dir` is set; every downstream
+        method indexes them exactly like in-memory arrays.
+
+        Args:
+            cube_shape (tuple): (n_frames, ny, nx) shape of the image cube.
+        """
+        cube_dtype = getattr(self, 'cube_dtype', np.float64)
+        memmap_dir = getattr(self, 'memmap_dir', None)
+
+        self.image_cube = allocate_cube(
+            cube_shape,
+            dtype=cube_dtype,
+            memmap_dir=memmap_dir,
+            name='image_cube'
+        )
+        self.noise_cube = allocate_cube(
+            cube_shape,
+            dtype=cube_dtype,
+            memmap_dir=memmap_dir,
+            name='noise_cube'
+        )
+        self.time_cube = np.zeros(cube_shape[0])
+
+        if memmap_dir is not None:
+            if not hasattr(self, 'memmap_files'):
+                self.memmap_files = []
+            self.memmap_files.extend(
+                [self.image_cube.filename, self.noise_cube.filename]
+            )
+
+        self.nan_free = False
+        self.invalidate_subframe_stack()
+
+    def close(self):
+        """ Release the memmap cubes and delete their backing files
+
+        Only the files created by `allocate_cubes` of this instance are
+        deleted; i.e. cached cubes from `load_data_from_fits_files` and the
+        cubes shared with `copy_instance` copies are left on disk.
+        """
+        memmap_files = getattr(self, 'memmap_files', [])
+        for name in ('image_cube', 'noise_cube'):
+            cube = getattr(self, name, None)
+            if isinstance(cube, np.memmap) and cube.filename in memmap_files:
+                cube.flush()
+                setattr(self, name, None)
+
+        self.invalidate_subframe_stack()
+
+        for memmap_path in memmap_files:
+            if os.path.exists(memmap_path):
+                os.remove(memmap_path)
+
+        self.memmap_files = []
+
+    def crop_slices(self, frame_shape, crop_rad=None, window=None):
+        """ Window of the detector frames that is kept in the cubes
+
+        Sets `self.crop_offset`, the (y, x) detector pixel of the cube origin,
+        and `self.crop_window`, the (ymin, ymax, xmin, xmax) of the window.
+        Centers are always stored in detector coordinates: the centering
+        methods add `crop_offset` and the background and photometry methods
+        subtract it before indexing the cubes.
+
+        Args:
+            frame_shape (tuple): (ny, nx) shape of the detector frames.
+            crop_rad (int, optional): Half width of the window around
+                (`yguess`, `xguess`). It should cover the largest aperture
+                or background annulus. Defaults to None, i.e. full frames.
+            window (tuple, optional): (ymin, ymax, xmin, xmax) window that
+                is used as is, i.e. `crop_window` of the cubes to append to.
+                Defaults to None, i.e. set by `crop_rad`.
+
+        Returns:
+            tuple: (y slice, x slice) of the window
+        """
+        ny, nx = frame_shape
+        if window is not None:
+            ymin, ymax, xmin, xmax = window
+        elif crop_rad is None:
+            ymin, ymax, xmin, xmax = 0, ny, 0, nx
+        else:
+            yguess, xguess = int(round(self.yguess)), int(round(self.xguess))
+            ymin = max(yguess - crop_rad, 0)
+            ymax = min(yguess + crop_rad + 1, ny)
+            xmin = max(xguess - crop_rad, 0)
+            xmax = min(xguess + crop_rad + 1, nx)
+
+        self.crop_offset = np.array([ymin, xmin])
+        self.crop_window = (ymin, ymax, xmin, xmax)
+
+        return slice(ymin, ymax), slice(xmin, xmax)
+
+    def cube_guess(self):
+        """ (`yguess`, `xguess`) in the coordinates of the (cropped) cubes """
+        yoffset, xoffset = getattr(self, 'crop_offset', np.zeros(2, dtype=int))
+        return self.yguess - yoffset, self.xguess - xoffset
+
+    def to_detector_coordinates(self, centers):
+        """ Shift (n_frames, 2) cube (y, x) centers to detector coordinates """
+        return np.asarray(centers) + getattr(self, 'crop_offset', 0)
+
+    def to_cube_coordinates(self, centers):
+        """ Shift (n_frames, 2) detector (y, x) centers to cube coordinates """
+        return np.asarray(centers) - getattr(self, 'crop_offset', 0)
+
+    def subframe_stack(self, half_width=None, clip=False):
+        """ Contiguous stack of the NaN-filled subframes around the guess
+
+        The (n_frames, 2*half_width, 2*half_width) stack is copied out of
+        `image_cube`, which is left untouched, with the NaNs of each subframe
+        set to its median. It is cached and rebuilt when `image_cube` is
+        replaced or reshaped, when the guess moves, when a wider box is
+        requested, or after `invalidate_subframe_stack`, i.e. when the pixels
+        of `image_cube` change in place; narrower boxes are views into the
+        cached stack.
+
+        Args:
+            half_width (int, optional): Half width of the box.
+                Defaults to None, i.e. `pix_rad`.
+            clip (bool, optional): Shrink the box to the largest one that
+                fits in the frames instead of raising. Defaults to False.
+
+        Returns:
+            tuple: (stack, (ylower, xlower)) with the lower corner of the box
+                in cube coordinates
+        """
+        half_width = self.pix_rad if half_width is None else half_width
+        half_width = int(half_width)
+        yguess, xguess = (int(guess) for guess in np.int32(self.cube_guess()))
+        if clip:
+            _, ny, nx = self.image_cube.shape
+            half_width = min(
+                half_width, yguess, ny - yguess, xguess, nx - xguess
+            )
+
+        cache = getattr(self, '_subframe_cache', None)
+        cache_valid = (
+            cache is not None
+            and cache['image_cube']() is self.image_cube
+            and cache['shape'] == self.image_cube.shape
+            and cache['guess'] == (yguess, xguess)
+            and cache['half_width'] >= half_width
+        )
+
+        if not cache_valid:
+            n_frames, ny, nx = self.image_cube.shape
+            if not (half_width <= yguess <= ny - half_width and
+                    half_width <= xguess <= nx - half_width):
+                raise ValueError(
+                    f'The subframes of half width {half_width} around '
+                    f'{(yguess, xguess)} do not fit in frames of shape '
+                    f'{(ny, nx)}'
+                )
+
+            stack = np.array(self.image_cube[
+                :,
+                yguess - half_width:yguess + half_width,
+                xguess - half_width:xguess + half_width
+            ])
+            fill_nans_with_frame_median(stack)
+
+            # A weak reference, such that the cache never keeps a replaced
+            #   cube alive
+            cache = {
+                'image_cube': weakref.ref(self.image_cube),
+                'shape': self.image_cube.shape,
+                'guess': (yguess, xguess),
+                'half_width': half_width,
+                'stack': stack,
+            }
+            self._subframe_cache = cache
+
+        trim = cache['half_width'] - half_width
+        stack = cache['stack']
+        if trim:
+            stack = stack[:, trim:-trim, trim:-trim]
+
+        return stack, (yguess - half_width, xguess - half_width)
+
+    def invalidate_subframe_stack(self):
+        """ Drop the cached `subframe_stack`
+
+        The cache notices a replaced or reshaped `image_cube`, but not edits
+        of its pixels; every method that changes `image_cube` in place calls
+        this, and so should any code that edits it from outside.
+        """
+        self._subframe_cache = None
+
+    def jwst_load_fits_file(self, crop_rad=None, window=None):
         """Class methods are similar to regular functions.
 
         Note:
@@ -193,11 +506,15 @@ class Wanderer(object):
         testfits = fits.open(self.fits_names[0])[0]
 
         self.n_frames = self.n_slope_files
-        self.image_cube = np.zeros(
-            (self.n_frames, testfits.data[0].shape[0], testfits.data[0].shape[1]))
-        self.noise_cube = np.zeros(
-            (self.n_frames, testfits.data[0].shape[0], testfits.data[0].shape[1]))
-        self.time_cube = np.zeros(self.n_frames)
+        ycrop, xcrop = self.crop_slices(
+            testfits.data[0].shape, crop_rad, window=window
+        )
+        cube_shape = (
+            self.n_frames,
+            ycrop.stop - ycrop.start,
+            xcrop.stop - xcrop.start
+        )
+        self.allocate_cubes(cube_shape)
 
         self.bad_pixel_masks = None
 
@@ -213,8 +530,8 @@ class Wanderer(object):
         for kf, fname in progress_fits_filenames:
             fits_now = fits.open(fname)
 
-            self.image_cube[kf] = fits_now[0].data[0]
-            self.noise_cube[kf] = fits_now[0].data[1]
+            self.image_cube[kf] = fits_now[0].data[0][ycrop, xcrop]
+            self.noise_cube[kf] = fits_now[0].data[1][ycrop, xcrop]
 
             # re-write these 4 lines into `get_julian_date_from_header`
             start_jd, end_jd = get_julian_date_from_header(fits_now[0].header)
@@ -229,37 +546,165 @@ class Wanderer(object):
 
             del fits_now
 
-    def spitzer_load_fits_file(self, output_units='electrons', remove_nans=True):
-        """Class methods are similar to regular functions.
+        self.invalidate_subframe_stack()
 
-        Note:
-            Do not include the `self` parameter in the ``Args`` section.
+    def jwst_load_calints_files(
+            self, window=None, integrations=None, remove_nans=True,
+            crop_rad=None):
+        """ Lazily load JWST calints segments as one frame per integration
+
+        Each segment is memory-mapped and only the requested integrations and
+        pixel window are read from the SCI and ERR extensions through FITS
+        section access, such that full-frame segments are never copied
+        whole into RAM.
+
+        Times are the `int_mid_BJD_TDB` column of the INT_TIMES extension
+        when it exists; otherwise they are the mid times of the integrations,
+        by their number in the exposure, spread uniformly between the
+        EXPSTART and EXPEND (MJD UTC) of the exposure. The time system,
+        'BJD_TDB' or 'MJD_UTC', is stored in `time_system`; segments with
+        different time systems raise a ValueError.
 
         Args:
-            param1: The first parameter.
-            param2: The second parameter.
+            window (tuple, optional): (ymin, ymax, xmin, xmax) pixel window
+                to read. Defaults to None, i.e. the full frame.
+            integrations (slice, optional): Integrations to read from each
+                segment. Defaults to None, i.e. all integrations.
+            remove_nans (bool, optional): Whether to set the NaNs of each
+                integration to its median while reading. Defaults to True.
+            crop_rad (int, optional): If given and `window` is None, the
+                window is set by `crop_slices`. Defaults to None.
+        """
+        integrations = slice(None) if integrations is None else integrations
+
+        # Read only the headers to size the cubes
+        segment_ints = []
+        exposure_ints = 0
+        for fname in self.fits_names:
+            sci_header = fits.getheader(fname, 'SCI')
+            n_ints = sci_header['NAXIS3']
+            segment_ints.append(np.arange(n_ints)[integrations])
+
+            # Number of integrations in the whole exposure
+            header = fits.getheader(fname)
+            int_end = header.get('INTSTART', 1) + n_ints - 1
+            exposure_ints = max(
+                exposure_ints,
+                header.get('NINTS', header.get('INTEND', int_end))
+            )
 
-        Returns:
-            True if successful, False otherwise.
+        ny, nx = sci_header['NAXIS2'], sci_header['NAXIS1']
+        ycrop, xcrop = self.crop_slices((ny, nx), crop_rad, window=window)
+        ymin, ymax, xmin, xmax = self.crop_window
+
+        self.n_frames = sum(ints.size for ints in segment_ints)
+        self.allocate_cubes((self.n_frames, ymax - ymin, xmax - xmin))
+
+        self.bad_pixel_masks = None
+
+        progress_fits_filenames = self.tqdm(
+            zip(self.fits_names, segment_ints),
+            desc='JWST Load calints',
+            leave=False,
+            total=self.n_slope_files
+        )
+
+        time_systems = set()
+        idx_start = 0
+        for fname, ints_now in progress_fits_filenames:
+            idx_ = slice(idx_start, idx_start + ints_now.size)
+            idx_start += ints_now.size
+
+            with fits.open(fname, memmap=True) as hdul:
+                self.image_cube[idx_] = hdul['SCI'].section[
+                    integrations, ymin:ymax, xmin:xmax
+                ]
+                if remove_nans:
+                    fill_nans_with_frame_median(self.image_cube[idx_])
+
+                self.noise_cube[idx_] = hdul['ERR'].section[
+                    integrations, ymin:ymax, xmin:xmax
+                ]
+
+                header = hdul[0].header
+
+                # Integration numbers are 1-based over the full exposure
+                int_start = header.get('INTSTART', 1)
+                int_numbers = int_start + ints_now
+
+                if 'INT_TIMES' in hdul:
+                    int_times = hdul['INT_TIMES'].data
+                    int_mids = dict(zip(
+                        int_times['integration_number'],
+                        int_times['int_mid_BJD_TDB']
+                    ))
+                    self.time_cube[idx_] = [int_mids[k] for k in int_numbers]
+                    time_systems.add('BJD_TDB')
+                else:
+                    # EXPSTART and EXPEND span all NINTS integrations of the
+                    #   exposure, not only those of this segment
+                    int_span = (header['EXPEND'] - header['EXPSTART']) / \
+                        exposure_ints
+                    self.time_cube[idx_] = header['EXPSTART'] + \
+                        int_span * (int_numbers - 1 + 0.5)
+                    time_systems.add('MJD_UTC')
+
+        if len(time_systems) > 1:
+            raise ValueError(
+                'Some segments have INT_TIMES (BJD_TDB) and others only '
+                'EXPSTART/EXPEND (MJD_UTC); their times cannot be mixed'
+            )
+
+        self.time_system = time_systems.pop()
+        self.nan_free = remove_nans
+        self.invalidate_subframe_stack()
 
+    def spitzer_load_fits_file(
+            self, output_units='electrons', remove_nans=True,
+            num_workers=None, crop_rad=None, prefetch_depth=None,
+            prefetch_threads=2, window=None):
+        """ Load Spitzer bcd/bunc files into the image, noise, and time cubes
+
+        Args:
+            output_units (str, optional): 'electrons' or 'muJ_per_Pixel'.
+                Defaults to 'electrons'.
+            remove_nans (bool, optional): Whether to replace NaNs with the
+                median. Defaults to True.
+            num_workers (int, optional): Number of threads reading files in
+                parallel; each file is written into its own cube slots, so
+                frames stay in order. Defaults to `self.num_cores`.
+            crop_rad (int, optional): Half width of the window around
+                (`yguess`, `xguess`) that is kept; see `crop_slices`.
+                Defaults to None, i.e. full frames.
+            prefetch_depth (int, optional): If given, `prefetch_threads`
+                background threads read up to this many upcoming bcd/bunc
+                pairs into memory while `num_workers` threads decode and
+                convert the pairs already read. Defaults to None, i.e. no
+                prefetching.
+            prefetch_threads (int, optional): Number of prefetching threads.
+                Defaults to 2.
+            window (tuple, optional): (ymin, ymax, xmin, xmax) window that
+                is kept instead of the `crop_rad` window; see `crop_slices`.
+                Defaults to None.
         """
         # BMJD_2_BJD = -0.5
         from scipy.constants import arcsec  # pi / arcsec = 648000
 
-        # sec2day = 1/(24*3600)
-        sec2day = 1 / self.day2sec
         nframes_per_file = 64
 
-        testfits = fits.open(self.fits_names[0])[0]
+        testfits = first_data_hdu(fits.open(self.fits_names[0]))
         testheader = testfits.header
 
         bcd_shape = testfits.data[0].shape
         # bcd_shape = testfits.data.shape
 
         self.n_frames = self.n_slope_files * nframes_per_file
-        self.image_cube = np.zeros((self.n_frames, bcd_shape[0], bcd_shape[1]))
-        self.noise_cube = np.zeros((self.n_frames, bcd_shape[0], bcd_shape[1]))
-        self.time_cube = np.zeros(self.n_frames)
+        ycrop, xcrop = self.crop_slices(bcd_shape, crop_rad, window=window)
+        self.allocate_cubes((
+            self.n_frames,
+            ycrop.stop - ycrop.start,
+            xcrop.stop - xcrop.start
+        ))
 
         self.bad_pixel_masks = None
 
@@ -293,79 +738,360 @@ class Wanderer(object):
 
         print('Loading Spitzer Data')
 
-        progress_fits_filenames = self.tqdm(
-            enumerate(self.fits_names),
-            desc='Spitzer Load File',
-            leave=False,
-            total=self.n_slope_files
+        num_workers = self.num_cores if num_workers is None else num_workers
+        num_workers = max(int(num_workers), 1)
+
+        load_one_file = partial(
+            self.spitzer_load_one_file,
+            flux_conversion=flux_conversion,
+            nframes_per_file=nframes_per_file,
+            crop=(ycrop, xcrop),
+            remove_nans=remove_nans
         )
-        for kfile, fname in progress_fits_filenames:
-            bcd_now = fits.open(fname)
-            bunc_now = fits.open(fname.replace('bcd.fits', 'bunc.fits'))
 
-            for iframe in range(nframes_per_file):
-                idx_ = kfile * nframes_per_file + iframe
-                header_ = bcd_now[0].header
-                bmjd_obs_ = header_['BMJD_OBS']
-                et_obs_ = header_['ET_OBS']
-                utcs_obs_ = header_['UTCS_OBS']
-                frametime_ = float(header_['FRAMTIME'])
+        def read_file_pair(fname):
+            return (
+                read_file_bytes(fname),
+                read_file_bytes(uncertainty_filename(fname))
+            )
 
-                # Convert from exposure time to UTC
-                et_to_utc = (et_obs_ - utcs_obs_) * sec2day
+        start = time()
+        io_stall = None
+        if prefetch_depth:
+            # Overlap slow storage with decoding: threads only read the bytes
+            io_stall = 0.
+            prefetched = prefetch(
+                self.fits_names,
+                read_file_pair,
+                depth=prefetch_depth,
+                num_threads=prefetch_threads
+            )
+            progress_fits_filenames = self.tqdm(
+                zip(self.fits_names, prefetched),
+                desc='Spitzer Load File',
+                leave=False,
+                total=self.n_slope_files
+            )
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                decoding = deque()
+                for kfile, (fname, ((bcd_bytes, bunc_bytes), stall)) in \
+                        enumerate(progress_fits_filenames):
+                    io_stall += stall
+                    decoding.append(executor.submit(
+                        load_one_file,
+                        kfile,
+                        fname,
+                        bcd_source=BytesIO(bcd_bytes),
+                        bunc_source=BytesIO(bunc_bytes)
+                    ))
+
+                    # At most `num_workers` pairs wait to be decoded, which
+                    #   bounds the bytes held in memory; `result` also
+                    #   propagates any exceptions
+                    if len(decoding) >= num_workers:
+                        decoding.popleft().result()
+
+                for future in decoding:
+                    future.result()
+        elif num_workers > 1:
+            # Reading and decoding FITS files is I/O and decode bound: threads
+            #   write straight into the preallocated (shared) cube slots
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                loaded_files = executor.map(
+                    load_one_file,
+                    range(self.n_slope_files),
+                    self.fits_names
+                )
+                # Consume the iterator to propagate any exceptions
+                for _ in self.tqdm(
+                        loaded_files,
+                        desc='Spitzer Load File',
+                        leave=False,
+                        total=self.n_slope_files):
+                    pass
+        else:
+            progress_fits_filenames = self.tqdm(
+                enumerate(self.fits_names),
+                desc='Spitzer Load File',
+                leave=False,
+                total=self.n_slope_files
+            )
+            for kfile, fname in progress_fits_filenames:
+                load_one_file(kfile, fname)
 
-                # Convert from exposure time to frame time in UTC
-                frametime_adjust = et_to_utc + iframe * frametime_ * sec2day
+        load_time = time() - start
+        print(
+            f'Loaded {self.n_slope_files} files in {load_time:.2f} seconds '
+            f'({self.n_slope_files / max(load_time, 1e-9):.1f} files/s) '
+            f'with {num_workers} workers'
+        )
+        if io_stall is not None:
+            print(
+                f'Waited {io_stall:.2f} seconds on I/O '
+                f'with a prefetch depth of {prefetch_depth} '
+                f'and {prefetch_threads} prefetch threads'
+            )
+
+        # NaNs were set to the median of their frame while loading each file
+        self.nan_free = remove_nans
+        self.invalidate_subframe_stack()
+
+    def spitzer_load_one_file(
+            self, kfile, fname, flux_conversion, nframes_per_file=64,
+            crop=None, remove_nans=False, bcd_source=None, bunc_source=None):
+        """ Load one bcd/bunc pair into its slots of the Spitzer cubes
 
-                # Same time as BMJD with UTC correction
-                self.time_cube[idx_] = bmjd_obs_ + frametime_adjust
+        Args:
+            kfile (int): Index of the file in `self.fits_names`.
+            fname (str): Path to the bcd file, which may be a `.gz` or `.fz`
+                file; the bunc file is inferred.
+            flux_conversion (float): Multiplicative flux unit conversion.
+            nframes_per_file (int, optional): Number of frames per subarray
+                file. Defaults to 64.
+            crop (tuple, optional): (y slice, x slice) window of each frame
+                to keep. Defaults to None, i.e. full frames.
+            remove_nans (bool, optional): Whether to set the NaNs of each
+                frame to the median of that frame. Defaults to False.
+            bcd_source (str or file-like, optional): Where to read the bcd
+                file from, i.e. prefetched bytes. Defaults to `fname`.
+            bunc_source (str or file-like, optional): Where to read the bunc
+                file from. Defaults to the bunc path inferred from `fname`.
+        """
+        if bcd_source is None:
+            bcd_source = fname
+        if bunc_source is None:
+            bunc_source = uncertainty_filename(fname)
+
+        crop = (slice(None), slice(None)) if crop is None else crop
+        sec2day = 1 / self.day2sec
 
-                self.image_cube[idx_] = bcd_now[0].data[iframe] * \
-                    flux_conversion
-                self.noise_cube[idx_] = bunc_now[0].data[iframe] * \
-                    flux_conversion
+        bcd_now = fits.open(bcd_source)
+        bunc_now = fits.open(bunc_source)
 
-            def delete_fits_data(fits_data):
-                del fits_data[0].data
-                fits_data.close()
-                del fits_data
+        # Read the header keys once per file, not once per frame
+        bcd_hdu = first_data_hdu(bcd_now)
+        bunc_hdu = first_data_hdu(bunc_now)
 
-            delete_fits_data(bcd_now)
-            delete_fits_data(bunc_now)
-            # del bcd_now[0].data
-            # bcd_now.close()
-            # del bcd_now
+        header_ = bcd_hdu.header
+        bmjd_obs_ = header_['BMJD_OBS']
+        et_obs_ = header_['ET_OBS']
+        utcs_obs_ = header_['UTCS_OBS']
+        frametime_ = float(header_['FRAMTIME'])
 
-            # del bunc_now[0].data
-            # bunc_now.close()
-            # del bunc_now
+        # Convert from exposure time to UTC
+        et_to_utc = (et_obs_ - utcs_obs_) * sec2day
 
+        # Convert from exposure time to frame time in UTC for all frames
+        frametime_adjust = et_to_utc + \
+            np.arange(nframes_per_file) * frametime_ * sec2day
+
+        idx_start = kfile * nframes_per_file
+        idx_ = slice(idx_start, idx_start + nframes_per_file)
+
+        # Same time as BMJD with UTC correction
+        self.time_cube[idx_] = bmjd_obs_ + frametime_adjust
+
+        self.image_cube[idx_] = bcd_hdu.data[
+            :nframes_per_file, crop[0], crop[1]
+        ] * flux_conversion
         if remove_nans:
-            # Set NaNs to Median
-            # where_is_nan_ = np.where(np.isnan(self.image_cube))
-            is_nan_ = np.isnan(self.image_cube)
-            self.image_cube[is_nan_] = np.nanmedian(self.image_cube)
+            fill_nans_with_frame_median(self.image_cube[idx_])
+
+        self.noise_cube[idx_] = bunc_hdu.data[
+            :nframes_per_file, crop[0], crop[1]
+        ] * flux_conversion
+
+        def delete_fits_data(fits_data):
+            del fits_data[0].data
+            fits_data.close()
+            del fits_data
 
-    def hst_load_fits_file(self, fits_now):
-        """Not Yet Implemented"""
-        raise NotImplementedError('HST Load Fits File does not exist, yet')
+        delete_fits_data(bcd_now)
+        delete_fits_data(bunc_now)
 
-    def load_data_from_fits_files(self, remove_nans=True):
+    def hst_load_fits_file(
+            self, remove_nans=True, crop_rad=None, window=None):
+        """ Load HST WFC3 ima files as differenced non-destructive reads
+
+        The reads of each file are stacked in one pass and differenced as
+        array operations; every pair of consecutive reads becomes one frame.
+        Frame times are EXPSTART plus the mid time of each pair of reads.
+
+        Args:
+            remove_nans (bool, optional): Whether to set the NaNs of each
+                frame to the median of that frame. Defaults to True.
+            crop_rad (int, optional): Half width of the window around
+                (`yguess`, `xguess`) that is kept; see `crop_slices`.
+                Defaults to None, i.e. full frames.
+            window (tuple, optional): (ymin, ymax, xmin, xmax) window that
+                is kept instead of the `crop_rad` window; see `crop_slices`.
+                Defaults to None.
+        """
+        # Read only the headers to size the cubes
+        n_diffs = [
+            fits.getheader(fname)['NSAMP'] - 1 for fname in self.fits_names
+        ]
+
+        with fits.open(self.fits_names[0]) as hdul:
+            frame_shape = hdul['SCI', 1].shape
+
+        ycrop, xcrop = self.crop_slices(frame_shape, crop_rad, window=window)
+
+        self.n_frames = sum(n_diffs)
+        self.allocate_cubes((
+            self.n_frames,
+            ycrop.stop - ycrop.start,
+            xcrop.stop - xcrop.start
+        ))
+
+        self.bad_pixel_masks = None
+
+        progress_fits_filenames = self.tqdm(
+            zip(self.fits_names, n_diffs),
+            desc='HST Load File',
+            leave=False,
+            total=self.n_slope_files
+        )
+
+        idx_start = 0
+        for fname, n_diff in progress_fits_filenames:
+            idx_ = slice(idx_start, idx_start + n_diff)
+            idx_start += n_diff
+
+            with fits.open(fname) as hdul:
+                diffs, diff_errors, diff_times = hst_differenced_reads(
+                    hdul, crop=(ycrop, xcrop)
+                )
+                expstart = hdul[0].header['EXPSTART']
+
+            self.image_cube[idx_] = diffs
+            self.noise_cube[idx_] = diff_errors
+            self.time_cube[idx_] = expstart + diff_times / self.day2sec
+
+            if remove_nans:
+                fill_nans_with_frame_median(self.image_cube[idx_])
+
+        self.nan_free = remove_nans
+        self.invalidate_subframe_stack()
+
+    def measure_hst_scan_drift(self, ylow=50, yhigh=90, upsample_factor=100):
+        """ Cross correlate the differenced reads of every HST file
+
+        Stores the (n_files, n_diffs, 2) x and y shifts with respect to the
+        first file in `self.hst_scan_shifts`, or a list of (n_diffs, 2)
+        shifts per file when the files have different NSAMP; see
+        `cross_correlation_hst_diff_ndr`.
+
+        Args:
+            ylow (int, optional): First row of the scan. Defaults to 50.
+            yhigh (int, optional): Last row (excluded) of the scan.
+                Defaults to 90.
+            upsample_factor (int, optional): Sub-pixel precision of the
+                cross-correlation is 1 / `upsample_factor`. Defaults to 100.
+        """
+        self.hst_scan_shifts = cross_correlation_hst_diff_ndr(
+            self.fits_names,
+            ylow=ylow,
+            yhigh=yhigh,
+            upsample_factor=upsample_factor,
+            num_cores=self.num_cores
+        )
+
+    def load_data_from_fits_files(
+            self, remove_nans=True, output_units='electrons', cache_dir=None,
+            window=None, crop_rad=None, prefetch_depth=None):
         """ Case function for loading fits from various telescope configurations
 
         Args:
             remove_nans (bool, optional): Whether to change the value of NaNs.
                 Defaults to True.
+            output_units (str, optional): Flux units of the Spitzer cubes.
+                Defaults to 'electrons'.
+            cache_dir (str, optional): If given, the converted image, noise,
+                and time cubes are cached here, keyed by a hash of the file
+                manifest, `output_units`, and `remove_nans`. Later runs with
+                the same inputs memory-map the cache instead of re-reading
+                the fits files. Defaults to None.
+            window (tuple, optional): (ymin, ymax, xmin, xmax) pixel window
+                kept from every frame instead of the `crop_rad` window.
+                Defaults to None.
+            crop_rad (int, optional): Crop each frame at ingestion to a
+                window of half width `crop_rad` around (`yguess`, `xguess`);
+                see `crop_slices`. Defaults to None, i.e. full frames.
+            prefetch_depth (int, optional): Number of Spitzer files read
+                ahead by background threads; see `spitzer_load_fits_file`.
+                Defaults to None.
         """
 
+        # References measured on previous cubes do not apply to the new ones;
+        #   `append_fits_files` restores them for the appended frames
+        self.cross_corr_reference = None
+        self.epsf = None
+
+        cache_names = ['image_cube', 'noise_cube', 'time_cube', 'crop_offset']
+        if cache_dir is not None:
+            cache_key = cube_cache_key(
+                self.fits_names,
+                output_units,
+                remove_nans,
+                self.telescope,
+                np.dtype(getattr(self, 'cube_dtype', np.float64)).str,
+                window,
+                crop_rad,
+                (self.yguess, self.xguess) if crop_rad is not None else None
+            )
+
+            cubes = load_cube_cache(cache_dir, cache_key, cache_names)
+            if cubes is not None:
+                print(f'Loading cached cubes {cache_key} from {cache_dir}')
+                for name, cube in cubes.items():
+                    setattr(self, name, cube)
+
+                self.n_frames = self.time_cube.size
+                self.crop_window = (
+                    self.crop_offset[0],
+                    self.crop_offset[0] + self.image_cube.shape[1],
+                    self.crop_offset[1],
+                    self.crop_offset[1] + self.image_cube.shape[2]
+                )
+                self.bad_pixel_masks = None
+                self.nan_free = remove_nans
+                self.invalidate_subframe_stack()
+                return
+
         if self.telescope == 'JWST':
-            self.jwst_load_fits_file()
+            if 'calints' in self.filetype:
+                self.jwst_load_calints_files(
+                    window=window,
+                    remove_nans=remove_nans,
+                    crop_rad=crop_rad
+                )
+            else:
+                self.jwst_load_fits_file(crop_rad=crop_rad, window=window)
 
         if self.telescope == 'Spitzer':
-            self.spitzer_load_fits_file(remove_nans=remove_nans)
+            self.spitzer_load_fits_file(
+                output_units=output_units,
+                remove_nans=remove_nans,
+                crop_rad=crop_rad,
+                prefetch_depth=prefetch_depth,
+                window=window
+            )
 
         if self.telescope == 'HST':
-            self.hst_load_fits_file()
+            self.hst_load_fits_file(
+                remove_nans=remove_nans,
+                crop_rad=crop_rad,
+                window=window
+            )
+
+        if cache_dir is not None:
+            print(f'Caching cubes {cache_key} in {cache_dir}')
+            save_cube_cache(
+                cache_dir,
+                cache_key,
+                **{name: getattr(self, name) for name in cache_names}
+            )
 
     def load_data_from_save_files(
             self, savefiledir=None, save_name_header=None,
@@ -571,6 +1297,7 @@ class Wanderer(object):
             'centering_fluxweight',
             'centering_gaussian_fit',
             'centering_least_asym',
+            'crop_offset',
             'effective_widths',
             'fits_file_dir',
             'fits_names',
@@ -639,7 +1366,10 @@ class Wanderer(object):
             xguess=self.xguess,
             pix_rad=self.pix_rad,
             method=self.method,
-            num_cores=self.num_cores
+            num_cores=self.num_cores,
+            cube_dtype=getattr(self, 'cube_dtype', np.float64),
+            memmap_dir=getattr(self, 'memmap_dir', None),
+            use_header_index=getattr(self, 'use_header_index', False)
         )
 
         temp.centering_df = self.centering_df
@@ -658,6 +1388,11 @@ class Wanderer(object):
         for thing in self.save_dict.keys():
             exec("temp." + thing + " = self.save_dict['" + thing + "']")
 
+        # The copy shares the cubes but owns neither their backing files nor
+        #   the subframe cache, such that `temp.close()` leaves `self` intact
+        temp.memmap_files = []
+        temp.invalidate_subframe_stack()
+
         return temp
 
     def find_bad_pixels(self, n_sig=5):
@@ -709,10 +1444,11 @@ class Wanderer(object):
 
         yinds0, xinds0 = np.indices(self.image_cube[0].shape)
 
-        ylower = np.int32(self.yguess - self.pix_rad)
-        yupper = np.int32(self.yguess + self.pix_rad)
-        xlower = np.int32(self.xguess - self.pix_rad)
-        xupper = np.int32(self.xguess + self.pix_rad)
+        yguess, xguess = self.cube_guess()
+        ylower = np.int32(yguess - self.pix_rad)
+        yupper = np.int32(yguess + self.pix_rad)
+        xlower = np.int32(xguess - self.pix_rad)
+        xupper = np.int32(xguess + self.pix_rad)
 
         # ylower, xlower, yupper, xupper = np.int32(
         #     [ylower, xlower, yupper, xupper]
@@ -728,6 +1464,11 @@ class Wanderer(object):
         # self.rotation_gaussian_fit = np.zeros(self.image_cube.shape[0])
         self.background_gaussian_fit = np.zeros(self.image_cube.shape[0])
 
+        sub_frames, _ = self.subframe_stack()
+
+        # H, Xc, Yc, Xs, Ys, O of every frame at once
+        cube_moments = moments_cube(sub_frames)
+
         progress_kframe = self.tqdm(
             range(self.n_frames),
             desc='GaussFit',
@@ -735,15 +1476,15 @@ class Wanderer(object):
             total=self.n_frames
         )
         for kf in progress_kframe:
-            subFrame_now = self.image_cube[kf][ylower:yupper, xlower:xupper]
-            # subFrame_now[np.isnan(subFrame_now)] = np.nanmedian(~np.isnan(subFrame_now))
-            subFrame_now[np.isnan(subFrame_now)] = np.nanmedian(subFrame_now)
+            subFrame_now = sub_frames[kf]
 
-            cmom = np.array(moments(subFrame_now))  # H, Xc, Yc, Xs, Ys, O
+            cmom = cube_moments[kf]  # H, Xc, Yc, Xs, Ys, O
 
             if method == 'aperture_photometry':
                 if initc == 'fluxweighted' and self.centering_fluxweight.sum():
-                    fwc_ = self.centering_fluxweight[kf]
+                    fwc_ = self.to_cube_coordinates(
+                        self.centering_fluxweight[kf]
+                    )
                     fwc_[self.y] = fwc_[self.y] - ylower
                     fwc_[self.x] = fwc_[self.x] - xlower
                     gaussI = np.hstack([cmom[0], fwc_, cmom[3:]])
@@ -755,19 +1496,16 @@ class Wanderer(object):
 
             if method == 'la':
                 # , xinds, yinds, np.copy(cmom)) # H, Xc, Yc, Xs, Ys, Th, O
-                p_gauss = fitgaussian(subFrame_now)
-
-            self.centering_gaussian_fit[kf][self.x] = p_gauss[1] + xlower
-            self.centering_gaussian_fit[kf][self.y] = p_gauss[2] + ylower
+                p_gauss = fitgaussian(subFrame_now, params=cmom)
 
-            self.widths_gaussian_fit[kf][self.x] = p_gauss[3]
-            self.widths_gaussian_fit[kf][self.y] = p_gauss[4]
-
-            self.heights_gaussian_fit[kf] = p_gauss[0]
-            self.background_gaussian_fit[kf] = p_gauss[5]
+            self.assign_gaussian_centering(p_gauss, xlower, kf, ylower)
 
             del p_gauss, cmom
 
+        self.centering_gaussian_fit = self.to_detector_coordinates(
+            self.centering_gaussian_fit
+        )
+
         self.centering_df = pd.DataFrame()
         self.centering_df['gaussian_fit_ycenters'] = self.centering_gaussian_fit.T[self.y]
         self.centering_df['gaussian_fit_xcenters'] = self.centering_gaussian_fit.T[self.x]
@@ -784,7 +1522,8 @@ class Wanderer(object):
             self, yguess=15, xguess=15, sub_array_size=10, init_params=None,
             useMoments=False, num_cores=cpu_count()-1, center_range=None,
             width_range=None, n_sig=6.1, method='leastsq', recheck_method=None,
-            median_crop=False, verbose=False):
+            median_crop=False, warm_start=False, seed_centering=None,
+            adaptive_refit=False, verbose=False):
         """Class methods are similar to regular functions.
 
         Note:
@@ -799,10 +1538,6 @@ class Wanderer(object):
 
         """
         y, x = 0, 1
-        if np.isnan(self.image_cube).any():
-            is_nan_ = np.isnan(self.image_cube)
-            self.image_cube[is_nan_] = np.nanmedian(self.image_cube)
-
         imageSize = self.image_cube.shape[1]
 
         nparams = 6
@@ -835,10 +1570,11 @@ class Wanderer(object):
         yy0, xx0 = np.indices(self.image_cube[0].shape)
 
         pix_rad = sub_array_size//2
-        ylower = self.yguess - self.pix_rad
-        yupper = self.yguess + self.pix_rad
-        xlower = self.xguess - self.pix_rad
-        xupper = self.xguess + self.pix_rad
+        yguess, xguess = self.cube_guess()
+        ylower = yguess - self.pix_rad
+        yupper = yguess + self.pix_rad
+        xlower = xguess - self.pix_rad
+        xupper = xguess + self.pix_rad
 
         ylower, xlower, yupper, xupper = np.int32(
             [ylower, xlower, yupper, xupper])
@@ -846,26 +1582,86 @@ class Wanderer(object):
         yy = yy0[ylower:yupper, xlower:xupper]
         xx = xx0[ylower:yupper, xlower:xupper]
 
+        # The fits run on the subframe stack, with the model on the
+        #   cube coordinates `yy` and `xx` of its pixels
+        sub_frames, _ = self.subframe_stack()
+
+        # Initial guesses of all frames at once, from the moments of the
+        #   subframes: unswap the centers and shift to cube coordinates
+        frame_init_params = moments_cube(sub_frames)[:, [0, 2, 1, 3, 4, 5]]
+        frame_init_params[:, 1] += ylower
+        frame_init_params[:, 2] += xlower
+
+        if seed_centering is not None:
+            # Start from the centers of a quicker method, i.e. 'quadratic'
+            if seed_centering not in self.centering_options:
+                raise ValueError(
+                    f'`seed_centering` must be in {self.centering_options}'
+                )
+
+            seed_columns = [
+                f'{seed_centering}_ycenters', f'{seed_centering}_xcenters'
+            ]
+            if seed_centering == 'quadratic' and not set(seed_columns) <= set(
+                    self.centering_df.columns):
+                self.fit_quadratic_peak_centering()
+
+            frame_init_params[:, 1:3] = self.to_cube_coordinates(
+                self.centering_df[seed_columns].values
+            )
+
         # pool = Pool(num_cores)
 
-        func = partial(
-            lmfit_one_center,
+        fit_kwargs = dict(
             yy=yy,
             xx=xx,
             gfit_model=gfit_model,
             lmfit_init_params=lmfit_init_params,
-            yupper=yupper,
-            ylower=ylower,
-            xupper=xupper,
-            xlower=xlower,
+            yupper=sub_frames.shape[1],
+            ylower=0,
+            xupper=sub_frames.shape[2],
+            xlower=0,
             method=method
         )
 
-        gaussian_centers = pool_run_func(func, zip(self.image_cube))
+        # One contiguous block of frames per worker; with `warm_start` each
+        #   fit is seeded from the solution of the previous frame
+        n_blocks = min(max(num_cores, 1), self.image_cube.shape[0])
+        block_edges = np.linspace(
+            0, self.image_cube.shape[0], n_blocks + 1).astype(int)
+        block_slices = [
+            slice(start, stop)
+            for start, stop in zip(block_edges[:-1], block_edges[1:])
+        ]
+
+        # The adaptive re-fits also flag the fits that did not converge
+        func = partial(
+            lmfit_block_centers,
+            warm_start=warm_start,
+            return_status=adaptive_refit,
+            **fit_kwargs
+        )
+        gaussian_centers = np.concatenate(pool_run_func(
+            func,
+            zip(
+                [sub_frames[block] for block in block_slices],
+                [frame_init_params[block] for block in block_slices]
+            ),
+            num_cores=n_blocks
+        ))
 
         # pool.close()
         # pool.join()
 
+        if adaptive_refit:
+            # Full-cost re-fits only where the quality flags ask for them
+            gaussian_centers, fit_flags, fit_refits = \
+                self.refit_flagged_gaussian_centers(
+                    gaussian_centers,
+                    lmfit_init_params,
+                    num_cores=num_cores
+                )
+
         print(
             'Finished with Fitting Centers. Now assigning to instance values.'
         )
@@ -912,16 +1708,9 @@ class Wanderer(object):
                     )
 
                 p_gauss = lmfit_one_center(
-                    self.image_cube[kf],
-                    yy=yy,
-                    xx=xx,
-                    gfit_model=gfit_model,
-                    lmfit_init_params=lmfit_init_params,
-                    yupper=yupper,
-                    ylower=ylower,
-                    xupper=xupper,
-                    xlower=xlower,
-                    method=recheck_method
+                    sub_frames[kf],
+                    init_values=frame_init_params[kf],
+                    **dict(fit_kwargs, method=recheck_method)
                 )
 
                 # ['center_y']
@@ -953,6 +1742,10 @@ class Wanderer(object):
             self.centering_gaussian_fit.T[y][outliers] = medY
             self.centering_gaussian_fit.T[x][outliers] = medX
 
+        self.centering_gaussian_fit = self.to_detector_coordinates(
+            self.centering_gaussian_fit
+        )
+
         try:
             self.centering_df = self.centering_df  # check if it exists
         except Exception as err:
@@ -972,14 +1765,258 @@ class Wanderer(object):
         self.centering_df['gaussian_fit_heights'] = self.heights_gaussian_fit
         self.centering_df['gaussian_fit_offset'] = self.background_gaussian_fit
 
+        if adaptive_refit:
+            # Quality flags of the final fits, and the re-fit strategy that
+            #   produced them: 0 for none and -1 when every strategy failed
+            self.centering_df['gaussian_fit_flags'] = fit_flags
+            self.centering_df['gaussian_fit_refit'] = fit_refits
+            self.centering_df['gaussian_fit_nfev'] = gaussian_centers.T[7]
+
+    def refit_flagged_gaussian_centers(
+            self, gaussian_centers, lmfit_init_params, n_sig=5.,
+            num_cores=None):
+        """ Re-fit only the frames whose Gaussian fit looks poor
+
+        Every fit is flagged by `gaussian_fit_flags` from its residual, its
+        parameter bounds, its center, and its convergence when given, with
+        limits from the robust spread of all fits. The flagged frames alone
+        are re-fit in parallel, going through `gaussian_refit_strategies`
+        until they are fixed. A re-fit is kept when it is finite, inside the
+        bounds, centered with the other frames, and converged, and its
+        residual over the unfiltered `pix_rad` box is below the limit or below
+        that of the first fit; the residual may stay high when the first fit
+        failed one of the other checks.
+
+        Args:
+            gaussian_centers (np.ndarray): (n_frames, 6) `lmfit_one_center`
+                fits of the `pix_rad` subframe stack, in cube coordinates,
+                or (n_frames, 8) with the success and number of function
+                evaluations of `return_status`, which are then checked and
+                kept up to date.
+            lmfit_init_params (lmfit.Parameters): Parameters with the bounds
+                of the fits.
+            n_sig (float, optional): Outlier limit in robust standard
+                deviations of the residuals and of the centers.
+                Defaults to 5.
+            num_cores (int, optional): Number of workers for the re-fits.
+                Defaults to None, i.e. `num_cores` of the instance.
+
+        Returns:
+            tuple: (n_frames, 6) or (n_frames, 8) fits, (n_frames,) quality
+                flags, and
+                (n_frames,) number of the strategy that re-fit each frame;
+                0 for none and -1 when every strategy failed
+        """
+        if num_cores is None:
+            num_cores = self.num_cores
+
+        gaussian_centers = np.array(gaussian_centers, dtype=float)
+        n_frames = len(gaussian_centers)
+
+        # Convergence of the fits, when `lmfit_block_centers` returned it
+        return_status = gaussian_centers.shape[1] > 6
+        success = gaussian_centers[:, 6] if return_status else None
+
+        param_names = [
+            'center_y', 'center_x', 'width_y', 'width_x', 'height', 'offset'
+        ]
+        lower = np.array([lmfit_init_params[name].min for name in param_names])
+        upper = np.array([lmfit_init_params[name].max for name in param_names])
+
+        sub_frames, (ylower, xlower) = self.subframe_stack()
+        yy, xx = np.mgrid[
+            ylower:ylower + sub_frames.shape[1],
+            xlower:xlower + sub_frames.shape[2]
+        ]
+        fit_params = gaussian_centers[:, :6]
+        chi2 = gaussian_fit_chi2(sub_frames, yy, xx, fit_params)
+
+        finite = np.all(np.isfinite(fit_params), axis=1)
+        finite &= np.isfinite(chi2)
+        flag_kwargs = dict(
+            lower=lower,
+            upper=upper,
+            chi2_limit=np.median(chi2[finite]) + n_sig * scale.mad(
+                chi2[finite]),
+            center_median=np.median(fit_params[finite, :2], axis=0),
+            center_scale=scale.mad(fit_params[finite, :2], axis=0),
+            n_sig=n_sig
+        )
+
+        flags = gaussian_fit_flags(
+            fit_params, chi2, success=success, **flag_kwargs
+        )
+        refits = np.zeros(n_frames, dtype=int)
+
+        flagged = np.where(flags)[0]
+        print(f'{len(flagged)} of {n_frames} Gaussian fits flagged for re-fit')
+
+        gfit_model = Model(gaussian, independent_vars=['yy', 'xx'])
+        strategies = enumerate(self.gaussian_refit_strategies, start=1)
+        for k_strategy, (method, extra_rad, filter_size) in strategies:
+            if not len(flagged):
+                break
+
+            try:
+                refit_frames, (refit_ylower, refit_xlower) = \
+                    self.subframe_stack(self.pix_rad + extra_rad)
+            except ValueError as err:
+                print(f'Skipping re-fit strategy {k_strategy}: {err}')
+                continue
+
+            refit_frames = refit_frames[flagged]
+            if filter_size is not None:
+                # Median filtering removes cosmic rays and hot pixels
+                refit_frames = median_filter(
+                    refit_frames, size=(1, filter_size, filter_size)
+                )
+            refit_yy, refit_xx = np.mgrid[
+                refit_ylower:refit_ylower + refit_frames.shape[1],
+                refit_xlower:refit_xlower + refit_frames.shape[2]
+            ]
+
+            init_values = moments_cube(refit_frames)[:, [0, 2, 1, 3, 4, 5]]
+            init_values[:, 1] += refit_ylower
+            init_values[:, 2] += refit_xlower
+
+            n_chunks = max(min(num_cores, len(flagged)), 1)
+            chunks = np.array_split(np.arange(len(flagged)), n_chunks)
+
+            func = partial(
+                lmfit_block_centers,
+                yy=refit_yy,
+                xx=refit_xx,
+                gfit_model=gfit_model,
+                lmfit_init_params=lmfit_init_params,
+                yupper=refit_frames.shape[1],
+                ylower=0,
+                xupper=refit_frames.shape[2],
+                xlower=0,
+                method=method,
+                warm_start=False,
+                return_status=return_status
+            )
+            refit_centers = np.concatenate(pool_run_func(
+                func,
+                zip(
+                    [refit_frames[chunk] for chunk in chunks],
+                    [init_values[chunk] for chunk in chunks]
+                ),
+                num_cores=n_chunks
+            ))
+
+            # Residuals of the unfiltered `pix_rad` box, as for the first
+            #   fits, whatever the strategy fit
+            refit_chi2 = gaussian_fit_chi2(
+                sub_frames[flagged], yy, xx, refit_centers[:, :6]
+            )
+            refit_flags = gaussian_fit_flags(
+                refit_centers[:, :6],
+                refit_chi2,
+                success=refit_centers[:, 6] if return_status else None,
+                **flag_kwargs
+            )
+
+            # A re-fit must clear every flag but the residual one, and then
+            #   lower the residual unless it cleared a flag of the first fit
+            structural = flags[flagged] & ~GAUSSIAN_FIT_HIGH_CHI2
+            fixed = (refit_flags & ~GAUSSIAN_FIT_HIGH_CHI2) == 0
+            fixed &= (
+                (refit_flags == 0) | (structural != 0) |
+                (refit_chi2 < chi2[flagged])
+            )
+            gaussian_centers[flagged[fixed]] = refit_centers[fixed]
+            flags[flagged[fixed]] = refit_flags[fixed]
+            refits[flagged[fixed]] = k_strategy
+            print(
+                f'Re-fit strategy {k_strategy} ({method}, +{extra_rad} pix, '
+                f'median filter {filter_size}) fixed {fixed.sum()} of '
+                f'{len(flagged)} frames'
+            )
+
+            flagged = flagged[~fixed]
+
+        refits[flagged] = -1
+
+        return gaussian_centers, flags, refits
+
+    def fit_batched_gaussian_centering(
+            self, init_params=None, max_iter=100, batch_size=4096):
+        """ Gaussian centering of all frames at once
+
+        Drop-in for `mp_lmfit_gaussian_centering`: the `pix_rad` subframes of
+        all frames are fit together by `batched_gaussian_fit`, a vectorized
+        Levenberg-Marquardt fitter with analytic Jacobians, and the same
+        arrays and `centering_df` columns are stored.
+
+        Args:
+            init_params (np.ndarray, optional): (6,) or (n_frames, 6) initial
+                height, center_y, center_x, width_y, width_x, offset in cube
+                coordinates. Defaults to None, i.e. the moments of each frame.
+            max_iter (int, optional): Maximum number of iterations.
+                Defaults to 100.
+            batch_size (int, optional): Number of frames fit together.
+                Defaults to 4096.
+        """
+        yguess, xguess = self.cube_guess()
+        ylower = np.int32(yguess - self.pix_rad)
+        yupper = np.int32(yguess + self.pix_rad)
+        xlower = np.int32(xguess - self.pix_rad)
+        xupper = np.int32(xguess + self.pix_rad)
+
+        yy, xx = np.mgrid[ylower:yupper, xlower:xupper]
+
+        sub_frames, _ = self.subframe_stack()
+
+        gaussian_centers = batched_gaussian_fit(
+            sub_frames,
+            yy,
+            xx,
+            init_params=init_params,
+            max_iter=max_iter,
+            batch_size=batch_size
+        )
+
+        self.centering_gaussian_fit = np.zeros((self.image_cube.shape[0], 2))
+        self.widths_gaussian_fit = np.zeros((self.image_cube.shape[0], 2))
+
+        # ['center_y'], ['center_x']
+        self.centering_gaussian_fit.T[self.y] = gaussian_centers.T[0]
+        self.centering_gaussian_fit.T[self.x] = gaussian_centers.T[1]
+
+        # ['width_y'], ['width_x']
+        self.widths_gaussian_fit.T[self.y] = gaussian_centers.T[2]
+        self.widths_gaussian_fit.T[self.x] = gaussian_centers.T[3]
+
+        self.heights_gaussian_fit = gaussian_centers.T[4].copy()  # ['height']
+        self.background_gaussian_fit = gaussian_centers.T[5].copy()  # offset
+
+        self.centering_gaussian_fit = self.to_detector_coordinates(
+            self.centering_gaussian_fit
+        )
+
+        ycenter = self.centering_gaussian_fit.T[self.y]
+        xcenter = self.centering_gaussian_fit.T[self.x]
+        self.centering_df['gaussian_fit_ycenters'] = ycenter
+        self.centering_df['gaussian_fit_xcenters'] = xcenter
+
+        y_width = self.widths_gaussian_fit.T[self.y]
+        x_width = self.widths_gaussian_fit.T[self.x]
+        self.centering_df['gaussian_fit_y_widths'] = y_width
+        self.centering_df['gaussian_fit_x_widths'] = x_width
+
+        self.centering_df['gaussian_fit_heights'] = self.heights_gaussian_fit
+        self.centering_df['gaussian_fit_offset'] = self.background_gaussian_fit
+
     def assign_gaussian_centering(self, p_gauss, xlower, kf, ylower):
 
+        # p_gauss is in the order of `gaussian`: H, Yc, Xc, Ys, Xs, O
         y, x = self.y, self.x
-        self.centering_gaussian_fit[kf][x] = p_gauss[1] + xlower
-        self.centering_gaussian_fit[kf][y] = p_gauss[2] + ylower
+        self.centering_gaussian_fit[kf][y] = p_gauss[1] + ylower
+        self.centering_gaussian_fit[kf][x] = p_gauss[2] + xlower
 
-        self.widths_gaussian_fit[kf][x] = p_gauss[3]
-        self.widths_gaussian_fit[kf][y] = p_gauss[4]
+        self.widths_gaussian_fit[kf][y] = p_gauss[3]
+        self.widths_gaussian_fit[kf][x] = p_gauss[4]
 
         self.heights_gaussian_fit[kf] = p_gauss[0]
         self.background_gaussian_fit[kf] = p_gauss[5]
@@ -1001,18 +2038,15 @@ class Wanderer(object):
 
         """
 
-        if np.isnan(self.image_cube).any():
-            is_nan_ = np.isnan(self.image_cube)
-            self.image_cube[is_nan_] = np.nanmedian(self.image_cube)
-
         y, x = self.y, self.x
 
         # yinds0, xinds0 = np.indices(self.image_cube[0].shape)
 
-        ylower = np.int32(self.yguess - self.pix_rad)
-        yupper = np.int32(self.yguess + self.pix_rad)
-        xlower = np.int32(self.xguess - self.pix_rad)
-        xupper = np.int32(self.xguess + self.pix_rad)
+        yguess, xguess = self.cube_guess()
+        ylower = np.int32(yguess - self.pix_rad)
+        yupper = np.int32(yguess + self.pix_rad)
+        xlower = np.int32(xguess - self.pix_rad)
+        xupper = np.int32(xguess + self.pix_rad)
 
         # ylower, xlower, yupper, xupper = np.int32(
         #     [ylower, xlower, yupper, xupper])
@@ -1031,18 +2065,28 @@ class Wanderer(object):
         # This starts the multiprocessing call to arms
         # pool = Pool(self.num_cores)
 
-        func = partial(
-            fit_one_center,
-            n_sig=n_sig,
-            method='gauss',
-            ylower=ylower,
-            yupper=yupper,
-            xlower=xlower,
-            xupper=xupper
-        )
+        # The fits run on the subframe stack, whose lower corner is at
+        #   (ylower, xlower) in the cube
+        sub_frames, _ = self.subframe_stack()
+
+        # Initial guesses of all frames at once: H, Xc, Yc, Xs, Ys, O
+        cube_moments = moments_cube(sub_frames)
 
         # the order is very important
-        gaussian_centers = pool_run_func(func, zip(self.image_cube))
+        gaussian_centers = pool_run_func(
+            fit_one_center,
+            zip(
+                sub_frames,
+                repeat(0),  # ylower
+                repeat(sub_frames.shape[1]),  # yupper
+                repeat(0),  # xlower
+                repeat(sub_frames.shape[2]),  # xupper
+                repeat(n_sig),
+                repeat('gaussian'),
+                repeat(7),  # b_size
+                cube_moments
+            )
+        )
 
         # pool.close()
         # pool.join()
@@ -1051,7 +2095,7 @@ class Wanderer(object):
             'Finished with Fitting Centers. Now assigning to instance values.'
         )
         for kf, p_gauss in enumerate(gaussian_centers):
-            self.assign_gaussian_centering(self, p_gauss, xlower, kf, ylower)
+            self.assign_gaussian_centering(p_gauss, xlower, kf, ylower)
             """ # TODO: confirm this is correct
             self.centering_gaussian_fit[kf][self.x] = p_gauss[1] + xlower
             self.centering_gaussian_fit[kf][self.y] = p_gauss[2] + ylower
@@ -1063,6 +2107,10 @@ class Wanderer(object):
             self.background_gaussian_fit[kf] = p_gauss[5]
             """
 
+        self.centering_gaussian_fit = self.to_detector_coordinates(
+            self.centering_gaussian_fit
+        )
+
         ycenter = self.centering_gaussian_fit.T[y]
         xcenter = self.centering_gaussian_fit.T[x]
 
@@ -1074,77 +2122,15 @@ class Wanderer(object):
         self.centering_df['gaussian_mom_ycenters'] = ycenter
         self.centering_df['gaussian_mom_xcenters'] = xcenter
 
-        self.centering_df['gaussian_fit_y_widths'] = y_width
-        self.centering_df['gaussian_fit_x_widths'] = x_width
-
-        self.centering_df['gaussian_fit_heights'] = self.heights_gaussian_fit
-        self.centering_df['gaussian_fit_offset'] = self.background_gaussian_fit
-
-        # self.centering_df['gaussian_fit_Rotation'] = self.rotation_gaussian_fit
-
-    def fit_flux_weighted_centering(self):
-        """Class methods are similar to regular functions.
-
-        Note:
-            Do not include the `self` parameter in the ``Args`` section.
-
-        Args:
-            param1: The first parameter.
-            param2: The second parameter.
-
-        Returns:
-            True if successful, False otherwise.
-
-        """
-
-        y, x = 0, 1
-
-        # yinds0, xinds0 = np.indices(self.image_cube[0].shape)
-
-        ylower = np.int32(self.yguess - self.pix_rad)
-        yupper = np.int32(self.yguess + self.pix_rad)
-        xlower = np.int32(self.xguess - self.pix_rad)
-        xupper = np.int32(self.xguess + self.pix_rad)
-
-        # yinds = yinds0[ylower:yupper, xlower:xupper]
-        # xinds = xinds0[ylower:yupper, xlower:xupper]
-
-        nFWCParams = 2  # Xc, Yc
-        self.centering_fluxweight = np.zeros((self.n_frames, nFWCParams))
-        # print(self.image_cube.shape)
-        progress_flux_wght_center = self.tqdm(
-            range(self.n_frames),
-            desc='Flux Weighted Centering',
-            leave=False,
-            total=self.n_frames
-        )
-
-        for kf in progress_flux_wght_center:
-            subFrame_now = self.image_cube[kf][ylower:yupper, xlower:xupper]
-            subFrame_now[np.isnan(subFrame_now)] = np.nanmedian(
-                ~np.isnan(subFrame_now))
-
-            self.centering_fluxweight[kf] = flux_weighted_centroid(
-                self.image_cube[kf],
-                self.yguess,
-                self.xguess,
-                b_size=7
-            )
-            self.centering_fluxweight[kf] = self.centering_fluxweight[kf][::-1]
+        self.centering_df['gaussian_fit_y_widths'] = y_width
+        self.centering_df['gaussian_fit_x_widths'] = x_width
 
-        self.centering_fluxweight[:, 0] = clip_outlier(
-            self.centering_fluxweight.T[0]
-        )
-        self.centering_fluxweight[:, 1] = clip_outlier(
-            self.centering_fluxweight.T[1]
-        )
+        self.centering_df['gaussian_fit_heights'] = self.heights_gaussian_fit
+        self.centering_df['gaussian_fit_offset'] = self.background_gaussian_fit
 
-        ycenter_ = self.centering_fluxweight.T[self.y]
-        xcenter_ = self.centering_fluxweight.T[self.x]
-        self.centering_df['fluxweighted_ycenters'] = ycenter_
-        self.centering_df['fluxweighted_xcenters'] = xcenter_
+        # self.centering_df['gaussian_fit_Rotation'] = self.rotation_gaussian_fit
 
-    def mp_fit_flux_weighted_centering(self, n_sig=False):
+    def fit_flux_weighted_centering(self, b_size=7, n_recenter=0):
         """Class methods are similar to regular functions.
 
         Note:
@@ -1158,51 +2144,46 @@ class Wanderer(object):
             True if successful, False otherwise.
 
         """
+        if n_recenter:
+            # Re-centered boxes move by at most b_size per iteration, so a
+            #   stack that wide around the guess holds every one of them
+            sub_frames, (ylower, xlower) = self.subframe_stack(
+                b_size * (n_recenter + 1), clip=True
+            )
+            yguess, xguess = self.cube_guess()
+
+            # All frames at once over the stacked boxes around the guess
+            self.centering_fluxweight = flux_weighted_centroid_cube(
+                sub_frames,
+                yguess - ylower,
+                xguess - xlower,
+                b_size=b_size,
+                n_recenter=n_recenter
+            ) + np.array([ylower, xlower])
+        else:
+            # The boxes around the guess are the subframe stack itself
+            sub_frames, (ylower, xlower) = self.subframe_stack(b_size)
+            self.centering_fluxweight = flux_weighted_centroid_cube(
+                sub_frames, b_size, b_size, b_size=b_size
+            ) + np.array([ylower, xlower])
 
-        # yinds0, xinds0 = np.indices(self.image_cube[0].shape)
-
-        ylower = np.int32(self.yguess - self.pix_rad)
-        yupper = np.int32(self.yguess + self.pix_rad)
-        xlower = np.int32(self.xguess - self.pix_rad)
-        xupper = np.int32(self.xguess + self.pix_rad)
-
-        # ylower, xlower, yupper, xupper = np.int32(
-        #     [ylower, xlower, yupper, xupper])
-
-        # yinds = yinds0[ylower:yupper, xlower:xupper]
-        # xinds = xinds0[ylower:yupper, xlower:xupper]
-
-        # nFWCParams = 2  # Xc, Yc
-        # self.centering_fluxweight = np.zeros((self.n_frames, nFWCParams))
-
-        # This starts the multiprocessing call to arms
-        # pool = Pool(self.num_cores)
-
-        func = partial(
-            fit_one_center,
-            n_sig=n_sig,
-            method='fwc',
-            ylower=ylower,
-            yupper=yupper,
-            xlower=xlower,
-            xupper=xupper,
-            b_size=7
+        self.centering_fluxweight[:, 0] = clip_outlier(
+            self.centering_fluxweight.T[0]
+        )
+        self.centering_fluxweight[:, 1] = clip_outlier(
+            self.centering_fluxweight.T[1]
         )
 
-        # the order is very important
-        fwc_centers = pool_run_func(func, zip(self.image_cube))
-
-        # pool.close()
-        # pool.join()
-
-        self.centering_fluxweight = np.array(fwc_centers)
+        self.centering_fluxweight = self.to_detector_coordinates(
+            self.centering_fluxweight
+        )
 
         ycenter_ = self.centering_fluxweight.T[self.y]
         xcenter_ = self.centering_fluxweight.T[self.x]
         self.centering_df['fluxweighted_ycenters'] = ycenter_
         self.centering_df['fluxweighted_xcenters'] = xcenter_
 
-    def fit_least_asymmetry_centering(self):
+    def mp_fit_flux_weighted_centering(self, n_sig=False):
         """Class methods are similar to regular functions.
 
         Note:
@@ -1216,184 +2197,120 @@ class Wanderer(object):
             True if successful, False otherwise.
 
         """
-        raise NotImplementedError(
-            'fit_least_asymmetry_centering is not longer operational'
-        )
-        y, x = 0, 1
-
-        # yinds0, xinds0 = np.indices(self.image_cube[0].shape)
+        # The whole cube takes milliseconds; a pool only adds overhead
+        self.fit_flux_weighted_centering()
 
-        ylower = np.int32(self.yguess - self.pix_rad)
-        yupper = np.int32(self.yguess + self.pix_rad)
-        xlower = np.int32(self.xguess - self.pix_rad)
-        xupper = np.int32(self.xguess + self.pix_rad)
+    def fit_least_asymmetry_centering(
+            self, method='gaus', maxcounts=2, num_cores=None):
+        """ Least-asymmetry centers (Lust et al. 2014) of all frames
 
-        # ylower, xlower, yupper, xupper = np.int32(
-        #     [ylower, xlower, yupper, xupper])
+        The default settings of `LEAST_ASYMMETRY_OPTIONS` are evaluated for
+        every frame at once by `least_asymmetry_centers`. Only the frames
+        where they fail go through the rest of the retry cascade, split
+        across a pool of workers. Frames where every option fails are set to
+        the initial guess. Near the frame edges the options are shrunk to
+        fit the subframes by `least_asymmetry_fitted_options`; when none
+        fits, every center is NaN.
 
-        # yinds = yinds0[ylower:yupper+1, xlower:xupper+1]
-        # xinds = xinds0[ylower:yupper+1, xlower:xupper+1]
+        Args:
+            method (str, optional): Sub-pixel center of the asymmetry
+                surface: 'gaus' or 'col'. Defaults to 'gaus'.
+            maxcounts (int, optional): Number of times the grid of trial
+                centers may be moved onto an edge minimum. Defaults to 2.
+            num_cores (int, optional): Number of workers for the retries.
+                Defaults to None, i.e. `num_cores` of the instance.
+        """
+        if num_cores is None:
+            num_cores = self.num_cores
+
+        # Every option reads at most this far from the guess, including the
+        #   moves of its grid of trial centers
+        half_box = 1 + max(
+            asym_rad + asym_size * (maxcounts + 1)
+            for _, asym_rad, asym_size in LEAST_ASYMMETRY_OPTIONS
+        )
+        sub_frames, (ylower, xlower) = self.subframe_stack(half_box, clip=True)
 
-        nAsymParams = 2  # Xc, Yc
-        self.centering_least_asym = np.zeros((self.n_frames, nAsymParams))
+        # Near the frame edges the clipped stack may be too narrow for the
+        #   default asymmetry boxes
+        options = least_asymmetry_fitted_options(sub_frames.shape[1:])
+        if options != LEAST_ASYMMETRY_OPTIONS:
+            print(
+                f'The {sub_frames.shape[1:]} subframes around the guess '
+                'cannot hold every least asymmetry box: using the options '
+                f'{options}'
+            )
 
-        progress_frame = self.tqdm(
-            range(self.n_frames),
-            desc='Asym',
-            leave=False,
-            total=self.n_frames
+        if not options:
+            print(
+                'Least Asymmetry FAILED: the subframes are too small. '
+                'Setting every center to NaN'
+            )
+            self.centering_least_asym = np.full((len(sub_frames), 2), np.nan)
+            self.centering_df['least_asym_ycenters'] = \
+                self.centering_least_asym.T[self.y]
+            self.centering_df['least_asym_xcenters'] = \
+                self.centering_least_asym.T[self.x]
+            return
+
+        yguess, xguess = self.cube_guess()
+        yguess, xguess = yguess - ylower, xguess - xlower
+
+        self.centering_least_asym, option_used = least_asymmetry_cascade(
+            sub_frames,
+            yguess,
+            xguess,
+            options=options[:1],
+            maxcounts=maxcounts,
+            method=method
         )
-        for kf in progress_frame:
-            """
-            The following is a sequence of error handling and reattempts to
-                center fit using the least_asymmetry algorithm
-
-            The least_asymmetry algorithm returns a RunError if the center
-                is not found in the image
-            Our experience shows that these failures are strongly correlated
-                with the existence of a cosmic ray hit nearby the PSF.
-
-            Option 1: We run `actr` with default settings
-                -- developed for Spitzer exoplanet lightcurves
-            Option 2: We assume that there is a deformation in the PSF
-                and square the image array (preserving signs)
-            Option 3: We assume that there is a cosmic ray hit nearby
-                the PSF and shrink the asym_rad by half
-            Option 4: We assume that there is a deformation in the PSF AND
-                (or caused by) a cosmic ray hit nearby the PSF; so we square
-                the image array (preserving signs)
-                AND shrink the asym_rad by half
-            Option 5: We assume that there is a deformation in the PSF AND
-                (or caused by) a cosmic ray hit nearby the PSF; so we square
-                the image array (preserving signs) AND shrink the asym_rad by
-                half BUT this time we have to get crazy and shrink the
-                asym_size to 2 (reduces accuracy dramatically)
-            """
 
-            fitFailed = False  # "Benefit of the Doubt"
+        failed = np.where(option_used < 0)[0]
+        if len(failed):
+            print(
+                f'Least Asymmetry failed on {len(failed)} frames with the '
+                'default settings: retrying the cascade on those frames'
+            )
 
-            # Option 1: We run `actr` with default settings
-            #   that were developed for Spitzer exoplanet lightcurves
-            kf, yguess, xguess = np.int32([kf, self.yguess, self.xguess])
+            n_chunks = max(min(num_cores, len(failed)), 1)
+            failed_chunks = np.array_split(failed, n_chunks)
 
-            try:
-                center_asym = actr(
-                    self.image_cube[kf],
-                    [yguess, xguess],
-                    asym_rad=8,
-                    asym_size=5,
-                    maxcounts=2,
-                    method='gaus',
-                    half_pix=False,
-                    resize=False,
-                    weights=False)[0]
-            except Exception as err:
-                print(f"Option 1 Fit Failed as {err}")
-                fitFailed = True
-
-            # Option 2: We assume that there is a deformation in the PSF
-            #   and square the image array (preserving signs)
-            if fitFailed:
-                try:
-                    center_asym = actr(
-                        np.sign(self.image_cube[kf])*self.image_cube[kf]**2,
-                        [yguess, xguess],
-                        asym_rad=8,
-                        asym_size=5,
-                        maxcounts=2,
-                        method='gaus',
-                        half_pix=False,
-                        resize=False,
-                        weights=False
-                    )[0]
-                    fitFailed = False
-                except Exception as err:
-                    print(f"Option 2 Fit Failed as {err}")
-
-            # Option 3: We assume that there is a cosmic ray hit
-            #   nearby the PSF and shrink the asym_rad by half
-            if fitFailed:
-                try:
-                    center_asym = actr(
-                        self.image_cube[kf],
-                        [yguess, xguess],
-                        asym_rad=4,
-                        asym_size=5,
-                        maxcounts=2,
-                        method='gaus',
-                        half_pix=False,
-                        resize=False,
-                        weights=False
-                    )[0]
-                    fitFailed = False
-                except Exception as err:
-                    print(f"Option 3 Fit Failed as {err}")
+            func = partial(
+                least_asymmetry_cascade,
+                options=options[1:],
+                maxcounts=maxcounts,
+                method=method
+            )
 
-            """
-            Option 4: We assume that there is a deformation in the PSF AND
-                (or caused by) a cosmic ray hit nearby the PSF; so we square
-                the image array (preserving signs) AND shrink the asym_rad by
-                half
-            """
-            if fitFailed:
-                try:
-                    center_asym = actr(
-                        np.sign(self.image_cube[kf])*self.image_cube[kf]**2,
-                        [yguess, xguess],
-                        asym_rad=4,
-                        asym_size=5,
-                        maxcounts=2,
-                        method='gaus',
-                        half_pix=False,
-                        resize=False,
-                        weights=False
-                    )[0]
-                    fitFailed = False
-                except Exception as err:
-                    print(f"Option 4 Fit Failed as {err}")
-
-            # Option 5: We assume that there is a deformation in the PSF
-            #   AND (or caused by) a cosmic ray hit nearby the PSF; so we
-            #       square the image array (preserving signs) AND shrink
-            #       the asym_rad by half
-            #   BUT this time we have to get crazy and shrink the asym_size
-            #       to 3 (reduces accuracy dramatically)
-            if fitFailed:
-                try:
-                    center_asym = actr(
-                        np.sign(self.image_cube[kf])*self.image_cube[kf]**2,
-                        [yguess, xguess],
-                        asym_rad=4,
-                        asym_size=3,
-                        maxcounts=2,
-                        method='gaus',
-                        half_pix=False,
-                        resize=False,
-                        weights=False
-                    )[0]
-                    fitFailed = False
-                except Exception as err:
-                    print(f"Option 5 Fit Failed as {err}")
-
-            if fitFailed:
-                # I ran out of options -- literally
-                print('Least Asymmetry FAILED: and returned `RuntimeError`')
+            retries = pool_run_func(
+                func,
+                zip(
+                    [sub_frames[chunk] for chunk in failed_chunks],
+                    repeat(yguess),
+                    repeat(xguess)
+                ),
+                num_cores=n_chunks
+            )
 
-            try:
-                # This will work if the fit was successful
-                self.centering_least_asym[kf] = center_asym[::-1]
-            except Exception as err:
-                print(f"Option X1 Fit Failed as {err}")
-                print('Least Asymmetry FAILED: and returned `NaN`')
-                fitFailed = True
-
-            if fitFailed:
-                print(
-                    f'Least Asymmetry FAILED: Setting self.centering_least_asym'
-                    f'[{kf}] to Initial Guess: [{self.yguess},{self.xguess}]'
+            for chunk, (centers_chunk, option_chunk) in zip(
+                    failed_chunks, retries):
+                self.centering_least_asym[chunk] = centers_chunk
+                option_used[chunk] = np.where(
+                    option_chunk < 0, -1, option_chunk + 1
                 )
 
-                self.centering_least_asym[kf] = np.array([yguess, xguess])
+        failed = option_used < 0
+        if failed.any():
+            # I ran out of options -- literally
+            print(
+                f'Least Asymmetry FAILED on {failed.sum()} frames: '
+                f'Setting them to Initial Guess: [{yguess},{xguess}]'
+            )
+            self.centering_least_asym[failed] = [yguess, xguess]
+
+        self.centering_least_asym = self.to_detector_coordinates(
+            self.centering_least_asym + np.array([ylower, xlower])
+        )
 
         ycenter_ = self.centering_least_asym.T[self.y]
         xcenter_ = self.centering_least_asym.T[self.x]
@@ -1414,60 +2331,237 @@ class Wanderer(object):
             True if successful, False otherwise.
 
         """
+        # All frames are evaluated at once; only the retries use the pool
+        self.fit_least_asymmetry_centering(num_cores=self.num_cores)
 
-        y, x = 0, 1
+    def fit_cross_correlation_centering(
+            self, reference=None, upsample_factor=100, normalization=None,
+            batch_size=1024, rebuild_reference=False):
+        """ Centers from the shift of every frame with respect to a reference
 
-        # yinds0, xinds0 = np.indices(self.image_cube[0].shape)
+        The `pix_rad` subframes around (`yguess`, `xguess`) of all frames are
+        cross correlated with a reference subframe in batched FFTs; see
+        `batched_cross_correlation_shifts`. The centers are the flux weighted
+        centroid of the reference plus the shift of each frame.
 
-        ylower = np.int32(self.yguess - self.pix_rad)
-        yupper = np.int32(self.yguess + self.pix_rad)
-        xlower = np.int32(self.xguess - self.pix_rad)
-        xupper = np.int32(self.xguess + self.pix_rad)
+        The reference, its centroid, and its lower corner are stored in
+        `cross_corr_reference`, `cross_corr_zero_point`, and
+        `cross_corr_corner` (detector coordinates) and are reused by later
+        calls, i.e. for the frames of `append_fits_files`, such that all
+        frames share one reference. Loading new cubes clears them.
 
-        # ylower, xlower, yupper, xupper = np.int32(
-        #     [ylower, xlower, yupper, xupper])
+        Args:
+            reference (np.ndarray, optional): Reference subframe.
+                Defaults to None, i.e. the stored reference or else the
+                median subframe.
+            upsample_factor (int, optional): Sub-pixel precision is
+                1 / `upsample_factor`. Defaults to 100.
+            normalization (str, optional): 'phase' for phase correlation or
+                None for plain cross-correlation, which is far less sensitive
+                to noise in a compact PSF. Defaults to None.
+            batch_size (int, optional): Number of frames per batched FFT.
+                Defaults to 1024.
+            rebuild_reference (bool, optional): Whether to replace the stored
+                reference with the median subframe. Defaults to False.
+        """
+        sub_frames, (ylower, xlower) = self.subframe_stack()
+        corner = self.to_detector_coordinates(np.array([ylower, xlower]))
+
+        stored_reference = getattr(self, 'cross_corr_reference', None)
+        reuse_reference = (
+            reference is None
+            and not rebuild_reference
+            and stored_reference is not None
+            and stored_reference.shape == sub_frames.shape[1:]
+        )
 
-        yguess, xguess = np.int32([self.yguess, self.xguess])
+        if reuse_reference:
+            reference = stored_reference
+        else:
+            if reference is None:
+                reference = np.median(sub_frames, axis=0)
+
+            # Zero point: flux weighted centroid of the reference above its
+            #   median
+            weights = np.clip(reference - np.median(reference), 0, None)
+            yinds, xinds = np.indices(reference.shape)
+            self.cross_corr_reference = reference
+            self.cross_corr_zero_point = corner + np.array([
+                (yinds * weights).sum() / weights.sum(),
+                (xinds * weights).sum() / weights.sum()
+            ])
+            self.cross_corr_corner = corner
+
+        shifts = batched_cross_correlation_shifts(
+            sub_frames,
+            reference=reference,
+            upsample_factor=upsample_factor,
+            normalization=normalization,
+            batch_size=batch_size
+        )
 
-        # yinds = yinds0[ylower:yupper+1, xlower:xupper+1]
-        # xinds = xinds0[ylower:yupper+1, xlower:xupper+1]
+        # Shifts are measured within the subframes, which may sit elsewhere
+        #   on the detector than those of the stored reference
+        self.centering_cross_corr = self.cross_corr_zero_point + shifts + \
+            (corner - self.cross_corr_corner)
 
-        # nAsymParams = 2  # Xc, Yc
-        # self.centering_least_asym = np.zeros((self.n_frames, nAsymParams))
-        # for kf in self.tqdm(range(self.n_frames), desc='Asym',
-        #   leave = False, total=self.n_frames):
-        # This starts the multiprocessing call to arms
-        # pool = Pool(self.num_cores)
+        ycenter_ = self.centering_cross_corr.T[self.y]
+        xcenter_ = self.centering_cross_corr.T[self.x]
+        self.centering_df['cross_corr_ycenters'] = ycenter_
+        self.centering_df['cross_corr_xcenters'] = xcenter_
 
-        func = partial(
-            actr,
-            asym_rad=8,
-            asym_size=5,
-            maxcounts=2,
-            method='gaus',
-            half_pix=False,
-            resize=False,
-            weights=False
+    def fit_quadratic_peak_centering(self, window=3, seed='max', n_refine=1):
+        """ Quick-look centers from 2D quadratics fit around the peak
+
+        The `window` x `window` pixels around the brightest pixel, or the
+        flux weighted center, of each `pix_rad` subframe are fit by
+        `quadratic_peak_centers` for all frames at once.
+
+        Args:
+            window (int, optional): Odd width of the neighborhood, i.e. 3 or
+                5. Defaults to 3.
+            seed (str, optional): 'max' for the brightest pixel or
+                'fluxweighted' for the flux weighted center of the subframe.
+                Defaults to 'max'.
+            n_refine (int, optional): Number of times each window is moved
+                onto its rounded peak and fit again. Defaults to 1.
+        """
+        if seed not in ('max', 'fluxweighted'):
+            raise ValueError("`seed` must be in ('max', 'fluxweighted')")
+
+        sub_frames, (ylower, xlower) = self.subframe_stack()
+
+        yseeds = xseeds = None
+        if seed == 'fluxweighted':
+            half_width = sub_frames.shape[1] // 2
+            yseeds, xseeds = flux_weighted_centroid_cube(
+                sub_frames, half_width, half_width, b_size=half_width
+            ).T
+
+        self.centering_quadratic = quadratic_peak_centers(
+            sub_frames,
+            window=window,
+            yseeds=yseeds,
+            xseeds=xseeds,
+            n_refine=n_refine
+        ) + np.array([ylower, xlower])
+
+        self.centering_quadratic = self.to_detector_coordinates(
+            self.centering_quadratic
         )
 
-        # the order is very important
-        self.centering_least_asym = pool_run_func(
-            func,
-            zip(
-                self.image_cube,
-                [[yguess, xguess]]*self.nframes
-            )
+        ycenter_ = self.centering_quadratic.T[self.y]
+        xcenter_ = self.centering_quadratic.T[self.x]
+        self.centering_df['quadratic_ycenters'] = ycenter_
+        self.centering_df['quadratic_xcenters'] = xcenter_
+
+    def fit_epsf_centering(
+            self, oversample=4, n_refine=5, n_sig=10., upsample_factor=100,
+            batch_size=1024, rebuild_template=False):
+        """ Centers from cross correlation with an empirical PSF template
+
+        An oversampled ePSF is built from the shift-and-add median of the
+        `pix_rad` subframes of all frames, aligned by their shifts with
+        respect to the median subframe, and every frame is then registered
+        onto it by batched FFT cross correlation; see `epsf_template` and
+        `epsf_centers`. The template is built once: rebuilding it from its
+        own centers aligns every frame a little more onto its own noise.
+        The centers are zeroed on the flux weighted centroid of the template.
+
+        The template, its zero point, and the median subframe and scatter
+        that seeded it are stored, and later calls, i.e. on the frames of
+        `append_fits_files`, are centered on them unless `rebuild_template`
+        is set or they do not match the subframes or `oversample`.
+
+        Args:
+            oversample (int, optional): Template cells per pixel.
+                Defaults to 4.
+            n_refine (int, optional): Number of residual refinements of the
+                template. Defaults to 5.
+            n_sig (float, optional): Pixels further than `n_sig` robust
+                standard deviations from their median over all frames, i.e.
+                cosmic rays, are replaced by that median; None keeps them.
+                The pointing jitter alone spreads the core pixels widely.
+                Defaults to 10.
+            upsample_factor (int, optional): Sub-pixel precision is
+                1 / `upsample_factor`. Defaults to 100.
+            batch_size (int, optional): Number of frames per batched FFT.
+                Defaults to 1024.
+            rebuild_template (bool, optional): Whether to replace the stored
+                template with one built from these frames.
+                Defaults to False.
+        """
+        sub_frames, (ylower, xlower) = self.subframe_stack()
+
+        stored_reference = getattr(self, 'epsf_reference', None)
+        reuse_template = (
+            not rebuild_template
+            and getattr(self, 'epsf', None) is not None
+            and stored_reference is not None
+            and stored_reference.shape == sub_frames.shape[1:]
+            and getattr(self, 'epsf_oversample', None) == oversample
         )
 
-        # pool.close()
-        # pool.join()
+        if reuse_template:
+            reference = self.epsf_reference
+            pixel_scale = self.epsf_scale
+        else:
+            reference = np.median(sub_frames, axis=0)
+            pixel_scale = scale.mad(sub_frames, axis=0)
+
+        if n_sig is not None:
+            outliers = np.abs(sub_frames - reference) > n_sig * pixel_scale
+            sub_frames = np.where(outliers, reference, sub_frames)
+
+        half_width = reference.shape[0] // 2
+        centers = flux_weighted_centroid_cube(
+            reference[None], half_width, half_width, b_size=half_width
+        ) + batched_cross_correlation_shifts(
+            sub_frames,
+            reference=reference,
+            upsample_factor=upsample_factor,
+            normalization=None,
+            batch_size=batch_size
+        )
 
-        self.centering_least_asym = np.array(self.centering_least_asym[0])
+        if not reuse_template:
+            self.epsf = epsf_template(
+                sub_frames, *centers.T, oversample=oversample,
+                n_refine=n_refine
+            )
 
-        ycenter_ = self.centering_least_asym.T[self.y]
-        xcenter_ = self.centering_least_asym.T[self.x]
-        self.centering_df['least_asym_ycenters'] = ycenter_
-        self.centering_df['least_asym_xcenters'] = xcenter_
+            # Zero point: flux weighted centroid of the template above zero
+            weights = np.clip(self.epsf, 0, None)
+            ycell0, xcell0 = (np.array(self.epsf.shape) - 1) // 2
+            yoffsets, xoffsets = np.indices(self.epsf.shape)
+            yoffsets = (yoffsets - ycell0) / oversample
+            xoffsets = (xoffsets - xcell0) / oversample
+            self.epsf_zero_point = np.array([
+                (yoffsets * weights).sum() / weights.sum(),
+                (xoffsets * weights).sum() / weights.sum()
+            ])
+            self.epsf_oversample = oversample
+            self.epsf_reference = reference
+            self.epsf_scale = pixel_scale
+
+        centers = epsf_centers(
+            sub_frames,
+            self.epsf,
+            oversample=oversample,
+            ycenters=centers.T[self.y],
+            xcenters=centers.T[self.x],
+            upsample_factor=upsample_factor,
+            batch_size=batch_size
+        )
+
+        self.centering_ePSF = self.to_detector_coordinates(
+            centers + self.epsf_zero_point + np.array([ylower, xlower])
+        )
+
+        ycenter_ = self.centering_ePSF.T[self.y]
+        xcenter_ = self.centering_ePSF.T[self.x]
+        self.centering_df['ePSF_ycenters'] = ycenter_
+        self.centering_df['ePSF_xcenters'] = xcenter_
 
     def fit_all_centering(self):
         """Class methods are similar to regular functions.
@@ -1484,22 +2578,106 @@ class Wanderer(object):
 
         """
 
-        print('Fit for Gaussian Fitting Centers\n')
-        self.mp_lmfit_gaussian_centering()
+        print(
+            'Fit for Gaussian Fitting, flux weighted, and Least Asymmetry '
+            'Centers\n'
+        )
+        self.fit_centering_methods(
+            methods=('gaussian_fit', 'fluxweighted', 'least_asym')
+        )
+
+    def fit_centering_methods(
+            self, methods=('gaussian_fit', 'fluxweighted', 'least_asym'),
+            method_kwargs=None):
+        """ Run several centering methods in one pass over one subframe stack
 
-        print('Fit for flux weighted Centers\n')
-        self.fit_flux_weighted_centering()
+        The box around (`yguess`, `xguess`) that every requested method
+        reads is copied out of `image_cube` once, which reads a memory-mapped
+        cube only once. Each method then runs on that stack, the same way it
+        runs on a cropped cube, and writes its usual `centering_df` columns.
 
-        print('Fit for Least Asymmetry Centers\n')
-        self.fit_least_asymmetry_centering()
+        Args:
+            methods (tuple, optional): Names from `centering_options`, except
+                'gaussian_mom'. Defaults to ('gaussian_fit', 'fluxweighted',
+                'least_asym').
+            method_kwargs (dict, optional): Keyword arguments per method name.
+                Defaults to None.
 
-    def measure_effective_width_subframe(self, pix_rad=None):
-        pix_rad = self.pix_rad if pix_rad is None else pix_rad
-        midFrame = self.image_cube.shape[1]//2
-        lower = midFrame - pix_rad
-        upper = midFrame + pix_rad
+        Returns:
+            dict: Seconds taken by each method
+        """
+        method_kwargs = {} if method_kwargs is None else method_kwargs
+
+        # (method that computes it, pixels it reads around the guess)
+        asym_kwargs = method_kwargs.get('least_asym', {})
+        _, asym_rad, asym_size = LEAST_ASYMMETRY_OPTIONS[0]
+        centering_methods = {
+            'gaussian_fit': ('mp_lmfit_gaussian_centering', self.pix_rad),
+            'fluxweighted': (
+                'fit_flux_weighted_centering',
+                method_kwargs.get('fluxweighted', {}).get('b_size', 7)
+            ),
+            'least_asym': (
+                'fit_least_asymmetry_centering',
+                asym_rad + asym_size * (1 + asym_kwargs.get('maxcounts', 2))
+            ),
+            'cross_corr': ('fit_cross_correlation_centering', self.pix_rad),
+            'quadratic': ('fit_quadratic_peak_centering', self.pix_rad),
+            'ePSF': ('fit_epsf_centering', self.pix_rad),
+        }
+
+        for method in methods:
+            if method not in centering_methods:
+                raise ValueError(
+                    f'`methods` must be in {tuple(centering_methods)}'
+                )
+
+        half_box = max(centering_methods[method][1] for method in methods)
+        n_frames, ny, nx = self.image_cube.shape
+        yguess, xguess = np.int32(self.cube_guess())
+        ylower = max(yguess - half_box, 0)
+        yupper = min(yguess + half_box + 1, ny)
+        xlower = max(xguess - half_box, 0)
+        xupper = min(xguess + half_box + 1, nx)
+
+        start = time()
+        sub_frames = np.array(self.image_cube[:, ylower:yupper, xlower:xupper])
+        if not getattr(self, 'nan_free', False):
+            fill_nans_with_frame_median(sub_frames)
+        print(f'Extracting the subframes took {time() - start:.2f} seconds')
 
-        image_view = self.image_cube[:, lower:upper, lower:upper]
+        image_cube = self.image_cube
+        crop_offset = self.crop_offset
+        nan_free = getattr(self, 'nan_free', False)
+        subframe_cache = getattr(self, '_subframe_cache', None)
+
+        method_times = {}
+        try:
+            # The stack is a crop of the cube: cube coordinates shift by its
+            #   lower corner and every method stores detector coordinates
+            self.image_cube = sub_frames
+            self.crop_offset = crop_offset + np.array([ylower, xlower])
+            self.nan_free = True
+
+            for method in methods:
+                stage, _ = centering_methods[method]
+                start = time()
+                getattr(self, stage)(**method_kwargs.get(method, {}))
+                method_times[method] = time() - start
+                print(
+                    f'{method} centering took {method_times[method]:.2f} '
+                    'seconds'
+                )
+        finally:
+            self.image_cube = image_cube
+            self.crop_offset = crop_offset
+            self.nan_free = nan_free
+            self._subframe_cache = subframe_cache
+
+        return method_times
+
+    def measure_effective_width_subframe(self, pix_rad=None):
+        image_view, _ = self.subframe_stack(pix_rad)
 
         image_sum_sq = image_view.sum(axis=(1, 2))**2.
         image_sq_sum = (image_view**2).sum(axis=(1, 2))
@@ -1570,6 +2748,8 @@ class Wanderer(object):
 
         self.background_circle_mask = np.zeros(self.n_frames)
 
+        centers = self.to_cube_coordinates(self.centering_fluxweight)
+
         progress_frame = self.tqdm(
             range(self.n_frames),
             desc='CircleBG',
@@ -1578,7 +2758,7 @@ class Wanderer(object):
         )
         for kf in progress_frame:
             aperture = create_aper_mask(
-                centering=self.centering_fluxweight[kf],
+                centering=centers[kf],
                 aper_rad=aper_rad,
                 image_shape=self.image_cube[0].shape,
                 method='exact'
@@ -1637,6 +2817,8 @@ class Wanderer(object):
         elif centering == 'fluxweight':
             centers = self.centering_fluxweight
 
+        centers = self.to_cube_coordinates(centers)
+
         # This starts the multiprocessing call to arms
         # pool = Pool(self.num_cores)
 
@@ -1674,6 +2856,8 @@ class Wanderer(object):
 
         self.background_annulus = np.zeros(self.n_frames)
 
+        centers = self.to_cube_coordinates(self.centering_fluxweight)
+
         progress_frame = self.tqdm(
             range(self.n_frames),
             desc='Annular BG',
@@ -1682,14 +2866,14 @@ class Wanderer(object):
         )
         for kf in progress_frame:
             inner_aper_mask = create_aper_mask(
-                centering=self.centering_fluxweight[kf],
+                centering=centers[kf],
                 aper_rad=inner_rad,
                 image_shape=self.image_cube[0].shape,
                 method='exact'
             )
 
             outer_aper_mask = create_aper_mask(
-                centering=self.centering_fluxweight[kf],
+                centering=centers[kf],
                 aper_rad=outer_rad,
                 image_shape=self.image_cube[0].shape,
                 method='exact'
@@ -1753,6 +2937,8 @@ class Wanderer(object):
         elif centering == 'fluxweight':
             centers = self.centering_fluxweight
 
+        centers = self.to_cube_coordinates(centers)
+
         # This starts the multiprocessing call to arms
         # pool = Pool(self.num_cores)
 
@@ -1792,6 +2978,8 @@ class Wanderer(object):
 
         self.background_median_mask = np.zeros(self.n_frames)
 
+        centers = self.to_cube_coordinates(self.centering_fluxweight)
+
         # the order is very important
         progress_frames = self.tqdm(
             range(self.n_frames),
@@ -1801,7 +2989,7 @@ class Wanderer(object):
         )
         for kf in progress_frames:
             aperture = create_aper_mask(
-                centering=self.centering_fluxweight[kf],
+                centering=centers[kf],
                 aper_rad=aper_rad,
                 image_shape=self.image_cube[0].shape,
                 method='exact'
@@ -1853,6 +3041,8 @@ class Wanderer(object):
         elif centering == 'fluxweight':
             centers = self.centering_fluxweight
 
+        centers = self.to_cube_coordinates(centers)
+
         # This starts the multiprocessing call to arms
         # pool = Pool(self.num_cores)
 
@@ -1890,6 +3080,8 @@ class Wanderer(object):
 
         self.background_kde_univ = np.zeros(self.n_frames)
 
+        centers = self.to_cube_coordinates(self.centering_fluxweight)
+
         progress_frames = self.tqdm(
             range(self.n_frames),
             desc='KDE Background',
@@ -1898,7 +3090,7 @@ class Wanderer(object):
         )
         for kf in progress_frames:
             aperture = create_aper_mask(
-                centering=self.centering_fluxweight[kf],
+                centering=centers[kf],
                 aper_rad=aper_rad,
                 image_shape=self.image_cube[0].shape,
                 method='exact'
@@ -1944,6 +3136,8 @@ class Wanderer(object):
         elif centering == 'fluxweight':
             centers = self.centering_fluxweight
 
+        centers = self.to_cube_coordinates(centers)
+
         self.background_kde_univ = np.zeros(self.n_frames)
 
         # This starts the multiprocessing call to arms
@@ -2054,16 +3248,9 @@ class Wanderer(object):
                 f"`background` must be in {self.background_df.columns}",
             )
 
-        centering_options = [
-            'gaussian_fit',
-            'gaussian_mom',
-            'fluxweighted',
-            'least_asym'
-        ]
-        if centering not in centering_options:
+        if centering not in self.centering_options:
             raise ValueError(
-                "`centering` must be either 'gaussian_fit', "
-                "'gaussian_mom', 'fluxweighted', or 'least_asym'"
+                f"`centering` must be in {self.centering_options}"
             )
 
         if aper_rad is None:
@@ -2077,7 +3264,9 @@ class Wanderer(object):
 
         ycenters = self.centering_df[centering + '_ycenters']
         xcenters = self.centering_df[centering + '_xcenters']
-        centering_Use = np.transpose([ycenters, xcenters])
+        centering_Use = self.to_cube_coordinates(
+            np.transpose([ycenters, xcenters])
+        )
 
         background_Use = self.background_df[background]
 
@@ -2200,18 +3389,16 @@ class Wanderer(object):
                 f"`background` must be in {self.background_df.columns}"
             )
 
-        centering_options = [
-            'gaussian_fit', 'gaussian_mom', 'fluxweighted', 'least_asym'
-        ]
-        if centering not in centering_options:
+        if centering not in self.centering_options:
             raise ValueError(
-                "`centering` must be either 'gaussian_fit', 'gaussian_mom', "
-                "'fluxweighted', or 'least_asym'"
+                f"`centering` must be in {self.centering_options}"
             )
 
         ycenter_ = self.centering_df[centering + '_ycenters']
         xcenter_ = self.centering_df[centering + '_xcenters']
-        centering_Use = np.transpose([ycenter_, xcenter_])
+        centering_Use = self.to_cube_coordinates(
+            np.transpose([ycenter_, xcenter_])
+        )
 
         background_Use = self.background_df[background]
 
@@ -2265,21 +3452,16 @@ class Wanderer(object):
                 f"`background` must be in {self.background_df.columns}"
             )
 
-        centering_options = [
-            'gaussian_fit',
-            'gaussian_mom',
-            'fluxweighted',
-            'least_asym'
-        ]
-        if centering not in centering_options:
+        if centering not in self.centering_options:
             raise KeyError(
-                "`centering` must be either 'gaussian_fit', 'gaussian_mom', "
-                "'fluxweighted', or 'least_asym'"
+                f"`centering` must be in {self.centering_options}"
             )
 
         ycenter_ = self.centering_df[centering + '_ycenters']
         xcenter_ = self.centering_df[centering + '_xcenters']
-        centering_Use = np.transpose([ycenter_, xcenter_])
+        centering_Use = self.to_cube_coordinates(
+            np.transpose([ycenter_, xcenter_])
+        )
 
         background_Use = self.background_df[background]
 
@@ -2348,18 +3530,16 @@ class Wanderer(object):
                 f"`background` must be in {self.background_df.columns}"
             )
 
-        centering_options = [
-            'gaussian_fit', 'gaussian_mom', 'fluxweighted', 'least_asym'
-        ]
-        if centering not in centering_options:
+        if centering not in self.centering_options:
             raise ValueError(
-                "`centering` must be either 'gaussian_fit', 'gaussian_mom', "
-                "'fluxweighted', or 'least_asym'"
+                f"`centering` must be in {self.centering_options}"
             )
 
         ycenter_ = self.centering_df[centering + '_ycenters']
         xcenter_ = self.centering_df[centering + '_xcenters']
-        centering_Use = np.transpose([ycenter_, xcenter_])
+        centering_Use = self.to_cube_coordinates(
+            np.transpose([ycenter_, xcenter_])
+        )
 
         background_Use = self.background_df[background]
 
@@ -2401,6 +3581,379 @@ class Wanderer(object):
                 'if you want to overwrite, then you `use_the_force=True`'
             )
 
+    def stream_pipeline(
+            self, files_per_block=16, aper_rads=None, output_units='electrons',
+            sub_array_size=10, inner_rad=8, outer_rad=13,
+            centering='gaussian_fit', background='annular_mask'):
+        """ Run the pipeline over the AOR in blocks of `files_per_block` files
+
+        Each block is loaded (with NaNs filled), centered, background
+        subtracted, and measured over `aper_rads`. Only the per-frame scalars
+        are appended to `centering_df`, `background_df`, `flux_tso_df`, and
+        `noise_tso_df`; the pixels of each block, and their memmap files when
+        `memmap_dir` is set, are released before the next block is loaded.
+        Peak memory and disk use are therefore set by `files_per_block`, not
+        by the length of the AOR.
+
+        After streaming, `image_cube` and `noise_cube` are set to None and
+        `time_cube` covers every frame.
+
+        Args:
+            files_per_block (int, optional): Number of files per block.
+                Defaults to 16.
+            aper_rads (list, optional): Aperture radii for the photometry.
+                Defaults to [3.0].
+            output_units (str, optional): Flux units of the Spitzer cubes.
+                Defaults to 'electrons'.
+            sub_array_size (int, optional): Gaussian centering sub array size.
+                Defaults to 10.
+            inner_rad (float, optional): Inner radius of the annular
+                background. Defaults to 8.
+            outer_rad (float, optional): Outer radius of the annular
+                background. Defaults to 13.
+            centering (str, optional): Centering used for the photometry.
+                Defaults to 'gaussian_fit'.
+            background (str, optional): Background used for the photometry.
+                Defaults to 'annular_mask'.
+        """
+        if aper_rads is None:
+            aper_rads = [3.0]
+
+        per_frame_arrays = self.per_frame_arrays
+        dataframe_names = self.tso_dataframes
+
+        fits_names = self.fits_names
+        n_files = len(fits_names)
+
+        block_frames = {name: [] for name in dataframe_names}
+        block_arrays = {name: [] for name in per_frame_arrays}
+        block_times = []
+
+        # Memmap files from before streaming are left to `close`
+        n_memmap_files = len(getattr(self, 'memmap_files', []))
+
+        start = time()
+        try:
+            for kfile in range(0, n_files, files_per_block):
+                self.fits_names = fits_names[kfile:kfile + files_per_block]
+                self.n_slope_files = len(self.fits_names)
+
+                print(
+                    f'Streaming files {kfile} to '
+                    f'{kfile + self.n_slope_files} of {n_files}'
+                )
+
+                for name in dataframe_names:
+                    setattr(self, name, pd.DataFrame())
+
+                self.load_data_from_fits_files(
+                    remove_nans=True,
+                    output_units=output_units
+                )
+
+                self.mp_lmfit_gaussian_centering(sub_array_size=sub_array_size)
+                self.fit_flux_weighted_centering()
+
+                self.mp_measure_background_annular_mask(
+                    inner_rad=inner_rad,
+                    outer_rad=outer_rad
+                )
+
+                for aper_rad in aper_rads:
+                    self.mp_compute_flux_over_time(
+                        aper_rad=aper_rad,
+                        centering=centering,
+                        background=background
+                    )
+
+                for name in dataframe_names:
+                    block_frames[name].append(getattr(self, name))
+
+                for name in per_frame_arrays:
+                    if hasattr(self, name):
+                        block_arrays[name].append(getattr(self, name))
+                        delattr(self, name)
+
+                block_times.append(np.array(self.time_cube))
+
+                # Release the pixels of this block before loading the next,
+                #   including the memmap files that `allocate_cubes` created
+                #   for it, such that the disk use is bounded too
+                self.image_cube = None
+                self.noise_cube = None
+                self.invalidate_subframe_stack()
+
+                memmap_files = getattr(self, 'memmap_files', [])
+                for memmap_path in memmap_files[n_memmap_files:]:
+                    if os.path.exists(memmap_path):
+                        os.remove(memmap_path)
+
+                del memmap_files[n_memmap_files:]
+        finally:
+            self.fits_names = fits_names
+            self.n_slope_files = n_files
+
+        for name in dataframe_names:
+            setattr(
+                self, name, pd.concat(block_frames[name], ignore_index=True)
+            )
+
+        for name, arrays in block_arrays.items():
+            if arrays:
+                setattr(self, name, np.concatenate(arrays))
+
+        self.time_cube = np.concatenate(block_times)
+        self.n_frames = self.time_cube.size
+
+        print(f'Streaming pipeline took {time() - start} seconds')
+
+    def parse_flux_key(self, flux_key):
+        """ Split a `flux_tso_df` key into its centering, background, radius
+
+        Args:
+            flux_key (str): Key as created by `mp_compute_flux_over_time`,
+                i.e. 'gaussian_fit_annular_mask_rad_3.0'.
+
+        Returns:
+            tuple or None: (centering, background, aper_rad), or None if the
+                key was not created with a single static aperture radius
+        """
+        for centering in self.centering_options:
+            for background in self.background_df.columns:
+                prefix = f'{centering}_{background}_rad_'
+                if not flux_key.startswith(prefix):
+                    continue
+
+                rad_str = flux_key[len(prefix):]
+                try:
+                    aper_rad = int(rad_str) if rad_str.isdigit() \
+                        else float(rad_str)
+                except ValueError:
+                    return None
+
+                if f'{aper_rad}' == rad_str:
+                    return centering, background, aper_rad
+
+        return None
+
+    def append_fits_files(
+            self, fits_names, output_units='electrons', remove_nans=True,
+            stage_kwargs=None):
+        """ Append new fits files and process only their frames
+
+        The new files are loaded into a separate block, which is passed
+        through every stage that already produced a column: centering
+        (`centering_df`), backgrounds (`background_df`), and each static
+        aperture radius key in `flux_tso_df`. The cubes, per-frame arrays,
+        and dataframes are then extended with the new frames, such that
+        the cost scales with the new data and not with the total data.
+        The new frames are cropped to the `crop_window` of the cubes.
+
+        Args:
+            fits_names (list): Paths to the new fits files.
+            output_units (str, optional): Flux units of the Spitzer cubes.
+                Defaults to 'electrons'.
+            remove_nans (bool, optional): Whether to change the value of NaNs.
+                Defaults to True.
+            stage_kwargs (dict, optional): Keyword arguments per stage method
+                name, i.e. {'mp_measure_background_annular_mask':
+                {'inner_rad': 6}}, to match the original run.
+                Defaults to None.
+        """
+        stage_kwargs = {} if stage_kwargs is None else stage_kwargs
+        fits_names = list(fits_names)
+
+        # (column that marks the stage as done, method that computes it)
+        centering_stages = [
+            ('gaussian_fit_ycenters', 'mp_lmfit_gaussian_centering'),
+            ('fluxweighted_ycenters', 'fit_flux_weighted_centering'),
+            ('least_asym_ycenters', 'fit_least_asymmetry_centering'),
+            ('cross_corr_ycenters', 'fit_cross_correlation_centering'),
+            ('quadratic_ycenters', 'fit_quadratic_peak_centering'),
+            ('ePSF_ycenters', 'fit_epsf_centering'),
+            ('effective_widths', 'measure_effective_width'),
+        ]
+        background_stages = [
+            ('Circle_mask', 'mp_measure_background_circle_masked'),
+            ('annular_mask', 'mp_measure_background_annular_mask'),
+            ('median_mask', 'mp_measure_background_median_masked'),
+            ('kde_univ_mask', 'measure_background_kde_mode'),
+            ('kde_univ_mask_mp', 'mp_measure_background_kde_mode'),
+        ]
+
+        centering_columns = list(self.centering_df.columns)
+        background_columns = list(self.background_df.columns)
+
+        flux_stages = []
+        for flux_key in self.flux_tso_df.columns:
+            flux_params = self.parse_flux_key(flux_key)
+            if flux_params is None:
+                print(f'Cannot recompute {flux_key} for appended frames')
+            else:
+                flux_stages.append(flux_params)
+
+        frame_names = ('image_cube', 'noise_cube', 'time_cube') + \
+            self.per_frame_arrays + self.tso_dataframes
+        previous = {
+            name: getattr(self, name)
+            for name in frame_names if hasattr(self, name)
+        }
+        previous_fits_names = self.fits_names
+        previous_nan_free = getattr(self, 'nan_free', False)
+        previous_crop_offset = np.array(self.crop_offset)
+        previous_crop_window = getattr(self, 'crop_window', None)
+        if previous_crop_window is None and \
+                getattr(self, 'image_cube', None) is not None:
+            # i.e. cubes saved before `crop_window` was recorded
+            previous_crop_window = (
+                previous_crop_offset[0],
+                previous_crop_offset[0] + self.image_cube.shape[1],
+                previous_crop_offset[1],
+                previous_crop_offset[1] + self.image_cube.shape[2]
+            )
+
+        previous_references = {
+            name: getattr(self, name)
+            for name in self.centering_references if hasattr(self, name)
+        }
+        previous_n_frames = getattr(self, 'n_frames', None)
+        previous_bad_pixel_masks = getattr(self, 'bad_pixel_masks', None)
+        memmap_dir = getattr(self, 'memmap_dir', None)
+
+        start = time()
+        try:
+            # Load the block in RAM: it must not overwrite the memmap files
+            self.memmap_dir = None
+            self.fits_names = fits_names
+            self.n_slope_files = len(fits_names)
+
+            for name in self.tso_dataframes:
+                setattr(self, name, pd.DataFrame())
+
+            for name in self.per_frame_arrays:
+                if hasattr(self, name):
+                    delattr(self, name)
+
+            self.load_data_from_fits_files(
+                remove_nans=remove_nans,
+                output_units=output_units,
+                window=previous_crop_window
+            )
+
+            # The appended frames are centered on the stored references
+            for name, value in previous_references.items():
+                setattr(self, name, value)
+
+            frame_shape = getattr(previous.get('image_cube'), 'shape', None)
+            if frame_shape is not None and \
+                    self.image_cube.shape[1:] != frame_shape[1:]:
+                raise ValueError(
+                    f'The appended frames of shape {self.image_cube.shape[1:]}'
+                    f' do not match the frames of shape {frame_shape[1:]}'
+                )
+
+            if not np.array_equal(self.crop_offset, previous_crop_offset):
+                raise ValueError(
+                    f'The appended frames start at detector pixel '
+                    f'{tuple(self.crop_offset)} instead of '
+                    f'{tuple(previous_crop_offset)}'
+                )
+
+            for column, stage in centering_stages + background_stages:
+                if column in centering_columns + background_columns:
+                    print(f'Running {stage} on the appended frames')
+                    getattr(self, stage)(**stage_kwargs.get(stage, {}))
+
+            for centering, background, aper_rad in flux_stages:
+                self.mp_compute_flux_over_time(
+                    aper_rad=aper_rad,
+                    centering=centering,
+                    background=background,
+                    use_the_force=True
+                )
+
+            block = {
+                name: getattr(self, name)
+                for name in frame_names if hasattr(self, name)
+            }
+
+            # Every array is merged before any of them is swapped in
+            merged = {}
+            for name in frame_names:
+                if name not in previous:
+                    continue
+
+                if name not in block:
+                    print(
+                        f'`{name}` was not recomputed for the appended frames'
+                    )
+                    merged[name] = previous[name]
+                elif name in self.tso_dataframes:
+                    merged[name] = pd.concat(
+                        [previous[name], block[name]], ignore_index=True
+                    )
+                elif name in ('image_cube', 'noise_cube'):
+                    if previous[name] is None:
+                        # i.e. after `stream_pipeline`, which releases the
+                        #   pixels
+                        merged[name] = None
+                    else:
+                        merged[name] = append_to_cube(
+                            previous[name], block[name]
+                        )
+                else:
+                    merged[name] = np.concatenate(
+                        [previous[name], block[name]]
+                    )
+        except Exception:
+            # Leave the instance as it was before the append
+            for name in frame_names:
+                if name in previous:
+                    setattr(self, name, previous[name])
+                elif hasattr(self, name):
+                    delattr(self, name)
+
+            for name, value in previous_references.items():
+                setattr(self, name, value)
+
+            self.nan_free = previous_nan_free
+            self.n_slope_files = len(previous_fits_names)
+            self.n_frames = previous_n_frames
+            self.bad_pixel_masks = previous_bad_pixel_masks
+
+            # Drop the frames that `append_to_cube` already wrote to disk
+            for name in ('image_cube', 'noise_cube'):
+                cube = previous.get(name)
+                if isinstance(cube, np.memmap) and cube.filename is not None:
+                    cube_size = cube.offset + cube.nbytes
+                    if os.path.getsize(cube.filename) > cube_size:
+                        os.truncate(cube.filename, cube_size)
+            raise
+        finally:
+            # The cubes keep their window whatever happened to the block
+            self.crop_offset = previous_crop_offset
+            self.crop_window = previous_crop_window
+            self.memmap_dir = memmap_dir
+            self.fits_names = previous_fits_names
+
+        for name, value in merged.items():
+            setattr(self, name, value)
+
+        self.invalidate_subframe_stack()
+
+        self.fits_names = list(previous_fits_names) + fits_names
+        self.n_slope_files = len(self.fits_names)
+        self.nan_free = previous_nan_free and self.nan_free
+        self.n_frames = self.time_cube.size
+
+        if getattr(self, 'bad_pixel_masks', None) is not None:
+            print('Resetting `bad_pixel_masks`: rerun `find_bad_pixels`')
+            self.bad_pixel_masks = None
+
+        print(
+            f'Appending {len(fits_names)} files took {time() - start} seconds'
+        )
+
     def extract_pld_components(
             self, ycenter=None, xcenter=None, nCols=3, nRows=3, order=1):
         """Class methods are similar to regular functions.
@@ -2423,6 +3976,14 @@ class Wanderer(object):
         # nRows = nRows // 2 #   and moves +\- nRows/2 and nCols/2, respectively
 
         img_shape = self.image_cube.shape[1:]
+
+        # Centers are given in detector coordinates, like every stored center
+        yoffset, xoffset = getattr(self, 'crop_offset', np.zeros(2, dtype=int))
+        if ycenter is not None:
+            ycenter = ycenter - yoffset
+        if xcenter is not None:
+            xcenter = xcenter - xoffset
+
         # nominally 15
         ycenter = int(ycenter) if ycenter is not None else img_shape[0]//2-1
         """
@@ -2445,7 +4006,26 @@ class Wanderer(object):
         xlower = xcenter - nCols // 2     # nominally 14
         xupper = xcenter + nCols // 2 + 1  # nominally 17 (to include 16)
 
-        image_sub_cube = self.image_cube[:, ylower:yupper, xlower:xupper]
+        # Read the pixels from the subframe stack when they lie inside it
+        try:
+            sub_frames, (stack_ylower, stack_xlower) = self.subframe_stack()
+        except ValueError:
+            # i.e. the `pix_rad` box does not fit in the frames
+            sub_frames, stack_ylower, stack_xlower = None, 0, 0
+
+        if (sub_frames is not None and
+                stack_ylower <= ylower and
+                yupper <= stack_ylower + sub_frames.shape[1] and
+                stack_xlower <= xlower and
+                xupper <= stack_xlower + sub_frames.shape[2]):
+            image_sub_cube = sub_frames[
+                :,
+                ylower - stack_ylower:yupper - stack_ylower,
+                xlower - stack_xlower:xupper - stack_xlower
+            ]
+        else:
+            image_sub_cube = self.image_cube[:, ylower:yupper, xlower:xupper]
+
         new_shape = self.image_cube.shape[0], n_pld_comp
         pld_comps_local = image_sub_cube.reshape(new_shape).T
 
@@ -2656,7 +4236,8 @@ def load_wanderer_instance_from_file(
     fits_file_dir, fitsFilenames, uncsFilenames = grab_dir_and_filenames(
         data_config=data_config,
         fits_format=data_config.fits_format,
-        unc_format=data_config.unc_format
+        unc_format=data_config.unc_format,
+        use_header_index=data_config.use_header_index
     )
 
     loadfiledir = os.path.join(
@@ -2666,7 +4247,14 @@ def load_wanderer_instance_from_file(
         data_config.aor_dir
     )
 
-    header_test = fits.getheader(fitsFilenames[0])
+    if data_config.use_header_index:
+        _, fits_headers = load_header_index(
+            fits_file_dir, f'{data_config.fits_format}.fits'
+        )
+        header_test = fits_headers[os.path.basename(fitsFilenames[0])]
+    else:
+        with fits.open(fitsFilenames[0]) as hdul:
+            header_test = first_data_hdu(hdul).header
 
     print(
         f'\n\nAORLABEL:\t{header_test["AORLABEL"]}'+'\n'
@@ -2695,7 +4283,8 @@ def load_wanderer_instance_from_file(
         yguess=yguess,
         xguess=xguess,
         method=data_config.method,
-        num_cores=data_config.num_cores
+        num_cores=data_config.num_cores,
+        use_header_index=data_config.use_header_index
     )
 
     wanderer.AOR = data_config.aor_dir